@@ -1,18 +1,23 @@
 // API Configuration
-const API_URL = 'http://localhost:5001/api';
+const API_URL = '/api';
+const BOOKS_PAGE_SIZE = 15;
+const BOOK_BATCH_SIZE = 100; // server's MAX_BATCH_SIZE
 
 // State Management
 const state = {
     currentUser: null,
     isLoginMode: true,
     currentBookId: null,
-    currentPage: 1,
+    nextCursor: null,
+    loadingBooks: false,
+    booksObserver: null,
     currentSearch: '',
     currentGenre: '',
     currentShelfFilter: 'all',
     selectedRating: 0,
     selectedShelfRating: 0,
     books: [],
+    bookDetails: {}, // id -> book, for shelf and profile entries
     shelfEntries: [],
     registeredUsers: {} // Store registered users
 };
@@ -192,11 +197,13 @@ function setupEventListeners() {
     heroSearchInput?.addEventListener('keypress', (e) => e.key === 'Enter' && performHeroSearch());
     heroSearchBtn?.addEventListener('click', performHeroSearch);
     document.getElementById('header-search')?.addEventListener('keypress', (e) => e.key === 'Enter' && performHeroSearch());
+    ['search-input', 'hero-search', 'header-search'].forEach(id => {
+        document.getElementById(id)?.addEventListener('input', (e) => suggestBooks(e.target.value));
+    });
 
     // Genre filter
     document.getElementById('genre-filter')?.addEventListener('change', (e) => {
         state.currentGenre = e.target.value;
-        state.currentPage = 1;
         performSearch();
     });
 
@@ -338,15 +345,28 @@ function handleLogout() {
 }
 
 // ============ Books Loading ============
-async function loadBooks() {
+async function loadBooks(append = false) {
+    if (append && (state.loadingBooks || !state.nextCursor)) return;
+    if (!append) {
+        state.nextCursor = null;
+    }
+    state.loadingBooks = true;
     try {
-        const response = await axios.get(`${API_URL}/books?page=${state.currentPage}`);
-        state.books = response.data.books;
+        const params = new URLSearchParams({ limit: BOOKS_PAGE_SIZE });
+        if (state.currentSearch) params.set('search', state.currentSearch);
+        if (state.currentGenre) params.set('genre', state.currentGenre);
+        if (append) params.set('after', state.nextCursor);
+
+        const response = await axios.get(`${API_URL}/books?${params}`);
+        state.books = append ? state.books.concat(response.data.books) : response.data.books;
+        state.nextCursor = response.data.next_cursor;
         displayBooks();
-        setupPagination(response.data.pages || 1);
+        setupPagination();
     } catch (error) {
         console.error('Failed to load books:', error);
         document.getElementById('books-grid').innerHTML = '<p class="text-red-600">Failed to load books. Please refresh.</p>';
+    } finally {
+        state.loadingBooks = false;
     }
 }
 
@@ -365,6 +385,11 @@ async function loadGenres() {
     }
 }
 
+// Covers are served from the local cover cache, resized to `size` (small, medium or full)
+function coverSrc(book, size, placeholder) {
+    return book.cover_image ? `${API_URL}/covers/${book.id}?size=${size}` : placeholder;
+}
+
 function displayBooks() {
     const grid = document.getElementById('books-grid');
     if (state.books.length === 0) {
@@ -384,7 +409,7 @@ function displayBooks() {
     grid.innerHTML = state.books.map(book => `
         <div class="book-card cursor-pointer" onclick="openBookModal(${book.id})">
             <img 
-                src="${book.cover_image || 'https://via.placeholder.com/200x300?text=No+Image'}" 
+                src="${coverSrc(book, 'medium', 'https://via.placeholder.com/200x300?text=No+Image')}" 
                 alt="${book.title}" 
                 class="book-card-image w-full rounded-lg bg-gray-200" 
                 style="aspect-ratio: 2/3; object-fit: cover;"
@@ -404,42 +429,36 @@ function displayBooks() {
     `).join('');
 }
 
-function setupPagination(totalPages) {
+function setupPagination() {
     const pagination = document.getElementById('pagination');
     pagination.innerHTML = '';
-
-    for (let i = 1; i <= totalPages; i++) {
-        const btn = document.createElement('button');
-        btn.textContent = i;
-        btn.className = `px-3 py-2 rounded border ${i === state.currentPage ? 'bg-amber-600 text-white' : 'border-gray-300 hover:bg-gray-100'}`;
-        btn.addEventListener('click', () => {
-            state.currentPage = i;
-            loadBooks();
-            window.scrollTo(0, 0);
-        });
-        pagination.appendChild(btn);
+    if (state.booksObserver) {
+        state.booksObserver.disconnect();
+        state.booksObserver = null;
+    }
+    if (!state.nextCursor) return;
+
+    // Infinite scroll: fetch the next page when the sentinel comes into view
+    const btn = document.createElement('button');
+    btn.textContent = 'Load more';
+    btn.className = 'px-4 py-2 rounded border border-gray-300 hover:bg-gray-100';
+    btn.addEventListener('click', () => loadBooks(true));
+    pagination.appendChild(btn);
+
+    if ('IntersectionObserver' in window) {
+        state.booksObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadBooks(true);
+            }
+        }, { rootMargin: '400px' });
+        state.booksObserver.observe(btn);
     }
 }
 
 // ============ Search & Filter ============
 async function performSearch() {
-    state.currentPage = 1;
-    const search = document.getElementById('search-input')?.value || '';
-    state.currentSearch = search;
-    
-    try {
-        const params = new URLSearchParams({
-            search: state.currentSearch,
-            genre: state.currentGenre,
-            page: state.currentPage
-        });
-        const response = await axios.get(`${API_URL}/books?${params}`);
-        state.books = response.data.books;
-        displayBooks();
-        setupPagination(response.data.total_pages);
-    } catch (error) {
-        console.error('Search failed:', error);
-    }
+    state.currentSearch = document.getElementById('search-input')?.value || '';
+    await loadBooks();
 }
 
 async function performHeroSearch() {
@@ -447,19 +466,42 @@ async function performHeroSearch() {
     if (!search.trim()) return;
     
     state.currentSearch = search;
-    state.currentPage = 1;
     state.currentGenre = '';
     document.getElementById('genre-filter').value = '';
     
-    try {
-        const response = await axios.get(`${API_URL}/books?search=${search}&page=1`);
-        state.books = response.data.books;
-        displayBooks();
-        setupPagination(response.data.total_pages);
-        document.getElementById('explore').scrollIntoView({ behavior: 'smooth' });
-    } catch (error) {
-        console.error('Search failed:', error);
-    }
+    await loadBooks();
+    document.getElementById('explore').scrollIntoView({ behavior: 'smooth' });
+}
+
+// Typeahead: fill the search inputs' shared datalist as the user types
+let suggestTimer = null;
+let suggestQuery = '';
+function suggestBooks(query) {
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(async () => {
+        query = query.trim();
+        if (query === suggestQuery) return;
+        suggestQuery = query;
+        const list = document.getElementById('book-suggestions');
+        if (!list) return;
+        if (query.length < 2) {
+            list.innerHTML = '';
+            return;
+        }
+        try {
+            const response = await axios.get(`${API_URL}/suggest`, { params: { q: query, limit: 8 } });
+            if (query !== suggestQuery) return; // a newer keystroke won
+            list.innerHTML = '';
+            response.data.suggestions.forEach(book => {
+                const option = document.createElement('option');
+                option.value = book.title;
+                option.label = book.author;
+                list.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Error loading suggestions:', error);
+        }
+    }, 120);
 }
 
 // ============ Book Detail Modal ============
@@ -472,7 +514,7 @@ async function openBookModal(bookId) {
         document.getElementById('modalBookTitle').textContent = book.title;
         document.getElementById('modalBookAuthor').textContent = `by ${book.author}`;
         const coverImg = document.getElementById('modalBookCover');
-        coverImg.src = book.cover_image || 'https://images.unsplash.com/photo-1507842217343-583f20270319?w=300&h=450&fit=crop';
+        coverImg.src = coverSrc(book, 'full', 'https://images.unsplash.com/photo-1507842217343-583f20270319?w=300&h=450&fit=crop');
         coverImg.onerror = function() {
             this.src = 'https://images.unsplash.com/photo-1507842217343-583f20270319?w=300&h=450&fit=crop';
         };
@@ -584,10 +626,26 @@ function closeBookModal() {
 }
 
 // ============ Shelf Management ============
+// Fetch details for books not already known, with one batch request per BOOK_BATCH_SIZE ids
+async function loadBookDetails(bookIds) {
+    state.books.forEach(book => { state.bookDetails[book.id] = book; });
+    const missing = [...new Set(bookIds)].filter(id => !state.bookDetails[id]);
+    const requests = [];
+    for (let i = 0; i < missing.length; i += BOOK_BATCH_SIZE) {
+        const ids = missing.slice(i, i + BOOK_BATCH_SIZE).join(',');
+        requests.push(axios.get(`${API_URL}/books`, { params: { ids, fields: 'title,author,cover_image,genre' } }));
+    }
+    const responses = await Promise.all(requests);
+    responses.forEach(response => {
+        response.data.books.forEach(book => { state.bookDetails[book.id] = book; });
+    });
+}
+
 async function loadShelfEntries() {
     try {
         const response = await axios.get(`${API_URL}/journal`);
         state.shelfEntries = response.data;
+        await loadBookDetails(state.shelfEntries.map(entry => entry.book_id));
         displayShelfItems();
     } catch (error) {
         console.error('Failed to load shelf:', error);
@@ -612,10 +670,10 @@ function displayShelfItems() {
     
     filtered.forEach(entry => {
         const clone = template.content.cloneNode(true);
-        const book = state.books.find(b => b.id === entry.book_id) || { title: entry.book_title, author: '', cover_image: '' };
+        const book = state.bookDetails[entry.book_id] || { title: entry.book_title, author: '', cover_image: '' };
         
         const coverImg = clone.querySelector('.shelf-cover');
-        coverImg.src = book.cover_image || 'https://via.placeholder.com/80x120?text=No+Image';
+        coverImg.src = coverSrc(book, 'small', 'https://via.placeholder.com/80x120?text=No+Image');
         coverImg.onerror = function() {
             this.src = 'https://via.placeholder.com/80x120?text=No+Image';
         };
@@ -780,30 +838,22 @@ function closeProfilePage() {
 
 async function loadProfileData() {
     try {
-        const shelfResponse = await axios.get(`${API_URL}/journal`);
+        const username = typeof state.currentUser === 'object' ? state.currentUser.username : state.currentUser;
+        const [statsResponse, shelfResponse, reviewsResponse] = await Promise.all([
+            axios.get(`${API_URL}/stats`, { params: { reviewer: username } }),
+            axios.get(`${API_URL}/journal`),
+            axios.get(`${API_URL}/reviews`, { params: { reviewer: username, limit: 100 } })
+        ]);
+        const stats = statsResponse.data;
         const shelfEntries = shelfResponse.data;
-        
-        // Load reviews for all books
-        const allReviews = [];
-        for (const book of state.books) {
-            const bookResponse = await axios.get(`${API_URL}/books/${book.id}`);
-            if (bookResponse.data.reviews) {
-                const username = typeof state.currentUser === 'object' ? state.currentUser.username : state.currentUser;
-                const userReviews = bookResponse.data.reviews.filter(r => r.reviewer_name === username);
-                userReviews.forEach(review => {
-                    review.book_title = book.title;
-                    review.book_id = book.id;
-                    review.book_cover = book.cover_image;
-                });
-                allReviews.push(...userReviews);
-            }
-        }
+        const allReviews = reviewsResponse.data.reviews;
+        await loadBookDetails(shelfEntries.map(entry => entry.book_id));
         
         // Update stats
-        document.getElementById('statTotalBooks').textContent = shelfEntries.length;
-        document.getElementById('statCompleted').textContent = shelfEntries.filter(e => e.status === 'completed').length;
-        document.getElementById('statReading').textContent = shelfEntries.filter(e => e.status === 'reading').length;
-        document.getElementById('statReviews').textContent = allReviews.length;
+        document.getElementById('statTotalBooks').textContent = stats.shelf.total;
+        document.getElementById('statCompleted').textContent = stats.shelf.by_status.completed || 0;
+        document.getElementById('statReading').textContent = stats.shelf.by_status.reading || 0;
+        document.getElementById('statReviews').textContent = stats.reviews.reviewer;
         
         // Display books
         displayProfileBooks(shelfEntries);
@@ -832,10 +882,10 @@ function displayProfileBooks(shelfEntries) {
     const statusColors = { 'want-to-read': 'bg-blue-100 text-blue-700', 'reading': 'bg-yellow-100 text-yellow-700', 'completed': 'bg-green-100 text-green-700' };
     
     const books = shelfEntries.map(entry => {
-        const book = state.books.find(b => b.id === entry.book_id) || {};
+        const book = state.bookDetails[entry.book_id] || {};
         return `
             <div class="profile-book-card dark:bg-gray-800 dark:border-gray-700">
-                <img src="${book.cover_image || 'https://via.placeholder.com/80x120?text=No+Image'}" alt="${entry.book_title}" class="profile-book-cover">
+                <img src="${coverSrc(book, 'small', 'https://via.placeholder.com/80x120?text=No+Image')}" alt="${entry.book_title}" class="profile-book-cover">
                 <div class="profile-book-info">
                     <h3 class="text-gray-900 dark:text-white">${entry.book_title}</h3>
                     <p class="text-sm text-gray-600 dark:text-gray-400">${book.author || 'Unknown Author'}</p>
@@ -959,7 +1009,6 @@ async function addNewBook() {
             alert('Book added successfully!');
             closeAddBookModal();
             // Reload books list
-            state.currentPage = 1;
             state.currentSearch = '';
             state.currentGenre = '';
             loadBooks();
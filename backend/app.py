@@ -1,31 +1,204 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, has_request_context, request, jsonify, send_file, stream_with_context
+from flask.cli import with_appcontext
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from datetime import datetime
+import base64
+import binascii
+import click
+import json
 import os
 
-app = Flask(__name__, instance_path=os.path.abspath(os.path.join(os.path.dirname(__file__), 'instance')))
-os.makedirs(app.instance_path, exist_ok=True)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(app.instance_path, 'bookify.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-CORS(app)
+from bulk_import import import_books, iter_csv, iter_ndjson
+from compression import init_compression
+from content_index import ContentIndex
+from covers import DEFAULT_ALLOWED_HOSTS as DEFAULT_COVER_HOSTS, SIZES as COVER_SIZES, CoverCache, CoverFetchError, urllib_fetcher
+from frontend import create_frontend_blueprint
+from genres import install_genre_index
+from group_commit import GroupCommitter, in_writer
+from isbn import backfill_isbn13, canonical_isbn, normalize_isbn
+from json_provider import FastJSONProvider
+import leaderboards
+from metrics import Metrics, capture_statements
+from query_budget import install_query_budget, query_budget, record_statements
+from recommendations import LIKE_THRESHOLD, TOP_K, SimilarRefresher, rebuild_similar, store_similar
+from response_cache import ResponseCache
+from schema import add_missing_columns
+from search import install_search_index, match_expression, search_subquery
+from suggest import SuggestIndex
+from sqlite_config import DEFAULT_ENGINE_OPTIONS, DEFAULT_PRAGMAS, configure_sqlite
+
+INSTANCE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'instance'))
+
+db = SQLAlchemy()
+response_cache = ResponseCache()
+metrics = Metrics()
+metrics.gauges.update({
+    'bookify_response_cache_entries': ('Responses held in the response cache', lambda: len(response_cache)),
+    'bookify_response_cache_hits': ('Response cache hits since start', lambda: response_cache.hits),
+    'bookify_response_cache_misses': ('Response cache misses since start', lambda: response_cache.misses),
+})
+api = Blueprint('api', __name__)
+
+def create_app(config=None):
+    """Build a configured Bookify app.
+
+    ``config`` overrides the defaults below, e.g. ``{'DATABASE_MODE':
+    'production'}`` or a different ``SQLALCHEMY_DATABASE_URI``.
+    """
+    app = Flask(__name__, instance_path=INSTANCE_PATH, static_folder=None)
+    app.json = FastJSONProvider(app)
+    os.makedirs(app.instance_path, exist_ok=True)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BOOKIFY_DATABASE_URI', 'sqlite:///' + os.path.join(app.instance_path, 'bookify.db')
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAX_PAGE_SIZE'] = 100
+    # Most books one batch lookup (?ids= or POST /api/books/batch) may request
+    app.config['MAX_BATCH_SIZE'] = 100
+    app.config['STREAM_BATCH_SIZE'] = 500
+    app.config['BULK_BATCH_SIZE'] = 1000
+    app.config['RESPONSE_CACHE_SIZE'] = 512
+    # 'production' enables WAL, tuned pragmas and a sized connection pool
+    # (see sqlite_config.py); 'development' keeps SQLite's defaults
+    app.config['DATABASE_MODE'] = os.environ.get('BOOKIFY_DB_MODE', 'development')
+    app.config['SQLITE_PRAGMAS'] = dict(DEFAULT_PRAGMAS)
+    # Serve index.html and the frontend assets from the API's origin
+    app.config['SERVE_FRONTEND'] = True
+    app.config['STATIC_MAX_AGE'] = 3600
+    # Local cover image cache (see covers.py); COVER_FETCHER may be any
+    # fetch(url) -> (bytes, content_type) callable, e.g. a test stub
+    app.config['COVER_CACHE_DIR'] = os.path.join(app.instance_path, 'covers')
+    app.config['COVER_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+    app.config['COVER_MAX_AGE'] = 7 * 24 * 3600
+    app.config['COVER_FETCHER'] = None
+    # Hosts the default fetcher may fetch covers from; None allows any public host
+    app.config['COVER_ALLOWED_HOSTS'] = list(DEFAULT_COVER_HOSTS)
+    # Content-based similar books index (see content_index.py); None keeps it
+    # next to the SQLite database file
+    app.config['CONTENT_INDEX_DIR'] = None
+    # How often each worker's typeahead index picks up books created by other
+    # workers, and rebuilds to refresh popularity (see suggest.py)
+    app.config['SUGGEST_REFRESH_SECONDS'] = 30
+    app.config['SUGGEST_REBUILD_SECONDS'] = 600
+    # Smaller text responses are sent uncompressed (see compression.py)
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    # 'raise', 'log' or 'off' for routes over their @query_budget; None
+    # picks 'raise' under TESTING and 'log' in debug mode (see query_budget.py)
+    app.config['QUERY_BUDGET'] = None
+    # Review and journal writes arriving within this many milliseconds share
+    # one transaction (see group_commit.py); None commits each on its own
+    app.config['GROUP_COMMIT_WINDOW_MS'] = 2
+    app.config['GROUP_COMMIT_MAX_BATCH'] = 256
+    # Log requests slower than this many milliseconds with the SQL they ran
+    # (see metrics.py); None disables the slow-request log
+    slow_ms = os.environ.get('BOOKIFY_SLOW_REQUEST_MS')
+    app.config['SLOW_REQUEST_MS'] = float(slow_ms) if slow_ms else None
+    app.config.update(config or {})
+    if app.config['DATABASE_MODE'] == 'production':
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', dict(DEFAULT_ENGINE_OPTIONS))
+
+    db.init_app(app)
+    CORS(app)
+    response_cache.max_entries = app.config['RESPONSE_CACHE_SIZE']
+    metrics.init_app(app)
+    # Registered after metrics so response sizes are recorded compressed
+    init_compression(app)
+    with app.app_context():
+        metrics.instrument_engine(db.engine)
+        install_query_budget(db.engine)
+        if app.config['DATABASE_MODE'] == 'production':
+            configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'], immediate_writes=is_write_request)
+
+    app.extensions['group_commit'] = GroupCommitter(
+        app, db.session, apply_write_batch, finish_write_batch,
+        window_ms=app.config['GROUP_COMMIT_WINDOW_MS'], max_batch=app.config['GROUP_COMMIT_MAX_BATCH'],
+        capture=capture_statements, replay=replay_write_statements
+    )
+    app.extensions['similar_refresher'] = SimilarRefresher(app, db.session, store_neighbours)
+    app.extensions['covers'] = CoverCache(
+        app.config['COVER_CACHE_DIR'], app.config['COVER_CACHE_MAX_BYTES'],
+        app.config['COVER_FETCHER'] or urllib_fetcher(allowed_hosts=app.config['COVER_ALLOWED_HOSTS'])
+    )
+    app.extensions['content_index'] = ContentIndex(
+        app.config['CONTENT_INDEX_DIR'] or default_content_index_dir(app)
+    )
+    app.extensions['suggest'] = SuggestIndex(
+        app, load_suggestions, lambda: current_data_version()[0],
+        refresh_seconds=app.config['SUGGEST_REFRESH_SECONDS'], rebuild_seconds=app.config['SUGGEST_REBUILD_SECONDS']
+    )
+    app.register_blueprint(api)
+    if app.config['SERVE_FRONTEND']:
+        app.register_blueprint(create_frontend_blueprint())
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(reconcile_ratings_command)
+    app.cli.add_command(rebuild_similar_command)
+    app.cli.add_command(rebuild_content_index_command)
+    app.cli.add_command(rebuild_leaderboards_command)
+    return app
+
+def default_content_index_dir(app):
+    """``<database>-content-index`` beside a SQLite file, so each database has its own index"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        return os.path.splitext(os.path.abspath(url.database))[0] + '-content-index'
+    return os.path.join(app.instance_path, 'content-index')
+
+# Upgrade existing tables and keep the FTS5 search index and genre table
+# alongside them on every create_all()
+event.listen(db.metadata, 'after_create', add_missing_columns)
+event.listen(db.metadata, 'after_create', backfill_isbn13)
+event.listen(db.metadata, 'after_create', install_search_index)
+event.listen(db.metadata, 'after_create', install_genre_index)
+
+# POST routes that only read, e.g. because their arguments don't fit in a URL
+READ_ONLY_ENDPOINTS = {'api.get_books_batch'}
+
+def is_write_request():
+    """True while handling a request that may write to the database, or on the group-commit writer"""
+    if in_writer():
+        return True
+    return (
+        has_request_context()
+        and request.method not in ('GET', 'HEAD', 'OPTIONS')
+        and request.endpoint not in READ_ONLY_ENDPOINTS
+    )
 
 # Database Models
+class Genre(db.Model):
+    """Distinct genre names with maintained book counts (see genres.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)
+    book_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
 class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
     author = db.Column(db.String(200), nullable=False, index=True)
     isbn = db.Column(db.String(20), unique=True, index=True)
+    # Canonical ISBN-13 of isbn, set whenever isbn is (see isbn.py); look books up by this
+    isbn13 = db.Column(db.String(13), index=True)
     description = db.Column(db.Text)
     cover_image = db.Column(db.String(500))
     genre = db.Column(db.String(100))
+    # Set from genre by database triggers; use it for filtering
+    genre_id = db.Column(db.Integer, db.ForeignKey('genre.id'), index=True)
     publication_year = db.Column(db.Integer)
     rating = db.Column(db.Float, default=0.0)
+    # Review aggregates, maintained incrementally by apply_review_delta()
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
-    reviews = db.relationship('Review', backref='book', lazy=True, cascade='all, delete-orphan')
+    reviews = db.relationship('Review', backref='book', lazy=True, cascade='all, delete-orphan', order_by='Review.id')
     journal_entries = db.relationship('JournalEntry', backref='book', lazy=True, cascade='all, delete-orphan')
     
+    @db.validates('isbn')
+    def _set_isbn13(self, key, value):
+        self.isbn13 = canonical_isbn(value)
+        return value
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -37,16 +210,21 @@ class Book(db.Model):
             'genre': self.genre,
             'publication_year': self.publication_year,
             'rating': round(self.rating, 1),
-            'review_count': len(self.reviews)
+            'review_count': self.review_count
         }
 
 class Review(db.Model):
+    # Covering indexes for the likes read by recommendations.py
+    __table_args__ = (
+        db.Index('ix_review_book_likes', 'book_id', 'rating', 'reviewer_name'),
+        db.Index('ix_review_reader_likes', 'reviewer_name', 'rating', 'book_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
-    reviewer_name = db.Column(db.String(200), nullable=False)
+    reviewer_name = db.Column(db.String(200), nullable=False, index=True)
     rating = db.Column(db.Integer, nullable=False)  # 1-5
     comment = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -62,7 +240,7 @@ class JournalEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
     user_notes = db.Column(db.Text)
-    status = db.Column(db.String(20), default='reading')  # reading, completed, want-to-read
+    status = db.Column(db.String(20), default='reading', index=True)  # reading, completed, want-to-read
     rating = db.Column(db.Integer)  # 1-5
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -79,38 +257,231 @@ class JournalEntry(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+class DataVersion(db.Model):
+    """Single-row counters bumped by every catalog or review write (``version``)
+    and every journal write (``shelf_version``).
+
+    Kept in the database rather than in memory so every worker process sees
+    the same versions when validating cached responses.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    shelf_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class BookSimilarity(db.Model):
+    """A book's top-K "also liked" neighbours, maintained by recommendations.py"""
+    __table_args__ = (
+        # The books listing a book, whose scores move with its liker count
+        db.Index('ix_book_similarity_listed', 'similar_id', 'book_id'),
+        {'sqlite_with_rowid': False},
+    )
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    co_likes = db.Column(db.Integer, nullable=False)
+
+class BookScore(db.Model):
+    """Bayesian-average score of each reviewed book, maintained by leaderboards.py"""
+    __table_args__ = (
+        db.Index('ix_book_score_rank', 'score', 'book_id'),
+        db.Index('ix_book_score_genre_rank', 'genre_id', 'score', 'book_id'),
+    )
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    genre_id = db.Column(db.Integer)
+    review_count = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class TrendingScore(db.Model):
+    """Each book's reviews in the last ``days`` days and their trending score (see leaderboards.py)"""
+    __table_args__ = (db.Index('ix_trending_score_rank', 'days', 'score', 'book_id'),)
+    days = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False)
+    rating_sum = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class LeaderboardState(db.Model):
+    """Single row: the UTC day the leaderboards were last rebuilt for, and the prior mean rating in use"""
+    id = db.Column(db.Integer, primary_key=True)
+    as_of = db.Column(db.Date, nullable=False)
+    prior_mean = db.Column(db.Float, nullable=False)
+
+# Fields a book payload can be projected to with ?fields=, and the compact
+# set list endpoints return by default (what a book card displays)
+BOOK_FIELDS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'isbn': Book.isbn,
+    'description': Book.description,
+    'cover_image': Book.cover_image,
+    'genre': Book.genre,
+    'publication_year': Book.publication_year,
+    'rating': Book.rating,
+    'review_count': Book.review_count,
+}
+LIST_FIELDS = ('id', 'title', 'author', 'cover_image', 'genre', 'rating', 'review_count')
+
+def requested_fields(default):
+    """Book fields named by ``?fields=a,b`` (``all`` for every field), else ``default``.
+
+    ``id`` is always included. Raises ValueError for an unknown field.
+    """
+    value = request.args.get('fields')
+    if not value:
+        return default
+    if value == 'all':
+        return tuple(BOOK_FIELDS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown field: {unknown[0]}')
+    return ('id',) + tuple(dict.fromkeys(name for name in names if name != 'id'))
+
+def book_query(fields):
+    """Query selecting only ``fields`` of each book, as rows rather than ORM objects"""
+    return db.session.query(*(BOOK_FIELDS[name] for name in fields)).select_from(Book)
+
+def book_row_dict(fields, row):
+    """Serialize a row from book_query() the way Book.to_dict() would"""
+    book = dict(zip(fields, row))
+    if 'rating' in book:
+        book['rating'] = round(book['rating'] or 0.0, 1)
+    return book
+
+def current_data_version():
+    """Return (version, last_modified) of the catalog data"""
+    row = db.session.get(DataVersion, 1)
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+def install_data_version(target, connection, **kw):
+    """Create the DataVersion row if it is missing, so every bump is a single UPDATE"""
+    if connection.execute(db.select(DataVersion.id).where(DataVersion.id == 1)).first() is None:
+        connection.execute(db.insert(DataVersion).values(id=1, version=0, shelf_version=0, updated_at=datetime.utcnow()))
+
+event.listen(db.metadata, 'after_create', install_data_version)
+
+def bump_data_version(catalog=True, shelf=False):
+    """Invalidate cached catalog responses, and with ``shelf`` the dashboard
+    counters, as part of the current transaction"""
+    values = {}
+    if catalog:
+        values.update(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    if shelf:
+        values['shelf_version'] = DataVersion.shelf_version + 1
+    if not values:
+        return
+    updated = db.session.execute(
+        db.update(DataVersion)
+        .where(DataVersion.id == 1)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if not updated.rowcount:
+        db.session.add(DataVersion(id=1, version=1, shelf_version=1))
+
+def rebuild_derived_data():
+    """Recompute what is derived from books and reviews after a seeder replaced them,
+    as part of the current transaction.
+
+    The leaderboards and the content index are rebuilt. "Also liked"
+    neighbours are only cleared; ``flask rebuild-similar`` recomputes them.
+    """
+    db.session.query(BookSimilarity).delete()
+    leaderboards.rebuild(db.session.connection(), datetime.utcnow().date())
+    build_content_index()
+
+def build_content_index():
+    """(Re)build the content index from every book in the catalog"""
+    current_app.extensions['content_index'].build(
+        db.session.query(Book.id, Book.description, Book.genre, Book.author).yield_per(1000)
+    )
+
 # Routes
-@app.route('/api/books', methods=['GET'])
+@api.route('/api/books', methods=['GET'])
+@query_budget(4)
+@response_cache.cached(current_data_version)
 def get_books():
-    """Get all books with optional filtering"""
+    """Get all books with optional filtering.
+
+    Passing ``after`` or ``limit`` switches to cursor pagination, which pages
+    in constant time and only counts the matches when ``count=1``.
+    ``facets=1`` adds per-genre counts for the current search.
+    Books carry LIST_FIELDS unless ``fields=`` names others (or ``all``).
+    ``ids=1,2,3`` looks up those books instead (see lookup_books).
+    """
+    if 'ids' in request.args:
+        try:
+            ids = [int(value) for value in request.args['ids'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+        return lookup_books(ids, request.args.get('reviews', 0, type=int))
+    
     search = request.args.get('search', '').lower()
     genre = request.args.get('genre')
     page = request.args.get('page', 1, type=int)
     per_page = 15
+    try:
+        fields = requested_fields(LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = Book.query
+    query = book_query(fields)
     
-    if search:
-        query = query.filter(
-            (Book.title.ilike(f'%{search}%')) |
-            (Book.author.ilike(f'%{search}%')) |
-            (Book.isbn.ilike(f'%{search}%'))
-        )
+    # An ISBN in any format is an exact lookup on the canonical ISBN column
+    isbn = canonical_isbn(search) if search else None
+    if isbn is not None:
+        query = query.filter(Book.isbn13 == isbn)
+    match = match_expression(search) if search and isbn is None else None
+    ranked = search_subquery(match) if match else None
+    if ranked is not None:
+        query = query.join(ranked, Book.id == ranked.c.book_id)
+        sort_keys = (ranked.c.rank, Book.id)
+    else:
+        sort_keys = (Book.id,)
+    query = query.order_by(*sort_keys)
     
     if genre:
-        query = query.filter(Book.genre.ilike(f'%{genre}%'))
+        genre_id = db.select(Genre.id).where(Genre.name == genre).scalar_subquery()
+        query = query.filter(Book.genre_id == genre_id)
+    
+    facets = genre_facets(ranked) if request.args.get('facets', type=int) else None
+    
+    if 'after' in request.args or 'limit' in request.args:
+        limit = request.args.get('limit', per_page, type=int)
+        try:
+            books, next_cursor = keyset_page(query, sort_keys, request.args.get('after'), limit)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        result = {
+            'books': [book_row_dict(fields, row) for row in books],
+            'next_cursor': next_cursor
+        }
+        if request.args.get('count', type=int):
+            result['total'] = query.order_by(None).count()
+        if facets is not None:
+            result['facets'] = facets
+        return jsonify(result)
     
     pagination = query.paginate(page=page, per_page=per_page)
-    books = [book.to_dict() for book in pagination.items]
+    books = [book_row_dict(fields, row) for row in pagination.items]
     
-    return jsonify({
+    result = {
         'books': books,
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': page
-    })
+    }
+    if facets is not None:
+        result['facets'] = facets
+    return jsonify(result)
 
-@app.route('/api/books/<int:book_id>', methods=['GET'])
+@api.route('/api/books/<int:book_id>', methods=['GET'])
+@query_budget(3)
+@response_cache.cached(current_data_version)
 def get_book(book_id):
     """Get a single book with its reviews"""
     book = Book.query.get_or_404(book_id)
@@ -118,15 +489,254 @@ def get_book(book_id):
     book_data['reviews'] = [review.to_dict() for review in book.reviews]
     return jsonify(book_data)
 
-@app.route('/api/books', methods=['POST'])
+@api.route('/api/books/isbn/<isbn>', methods=['GET'])
+@query_budget(2)
+@response_cache.cached(current_data_version)
+def get_book_by_isbn(isbn):
+    """Get the book with this ISBN, given as ISBN-10 or ISBN-13, with or without hyphens"""
+    canonical = canonical_isbn(isbn)
+    if canonical is None:
+        return jsonify({'error': f'Invalid ISBN: {isbn}'}), 400
+    book = Book.query.filter_by(isbn13=canonical).order_by(Book.id).first()
+    if book is None:
+        return jsonify({'error': 'Book not found'}), 404
+    return jsonify(book.to_dict())
+
+@api.route('/api/books/batch', methods=['POST'])
+@query_budget(2)
+def get_books_batch():
+    """Look up many books by id: ``{"ids": [1, 2, 3], "reviews": 3}`` (see lookup_books)"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(book_id, int) for book_id in ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    reviews = data.get('reviews', 0)
+    if not isinstance(reviews, int):
+        return jsonify({'error': 'reviews must be an integer'}), 400
+    return lookup_books(ids, reviews)
+
+def lookup_books(ids, reviews=0):
+    """Respond with the books in ``ids``, in that order, read with one IN query.
+
+    Unknown ids are listed under ``missing``. With ``reviews`` > 0 each book
+    embeds its latest reviews (up to that many), all read with one more query.
+    ``fields=`` applies as in get_books, defaulting to every field.
+    """
+    ids = list(dict.fromkeys(ids))
+    limit = current_app.config['MAX_BATCH_SIZE']
+    if len(ids) > limit:
+        return jsonify({'error': f'At most {limit} ids per request'}), 400
+    try:
+        fields = requested_fields(tuple(BOOK_FIELDS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    found = {}
+    if ids:
+        for row in book_query(fields).filter(Book.id.in_(ids)):
+            book = book_row_dict(fields, row)
+            found[book['id']] = book
+    
+    if reviews > 0 and found:
+        for book in found.values():
+            book['reviews'] = []
+        latest = (
+            db.select(Review, db.func.row_number().over(
+                partition_by=Review.book_id, order_by=Review.id.desc()
+            ).label('position'))
+            .where(Review.book_id.in_(found))
+            .subquery()
+        )
+        recent = db.aliased(Review, latest)
+        query = (
+            db.select(recent)
+            .where(latest.c.position <= min(reviews, current_app.config['MAX_PAGE_SIZE']))
+            .order_by(latest.c.book_id, latest.c.position)
+        )
+        for review in db.session.scalars(query):
+            found[review.book_id]['reviews'].append(review.to_dict())
+    
+    return jsonify({
+        'books': [found[book_id] for book_id in ids if book_id in found],
+        'missing': [book_id for book_id in ids if book_id not in found]
+    })
+
+@api.route('/api/books/<int:book_id>/similar', methods=['GET'])
+@query_budget(4)
+@response_cache.cached(current_data_version)
+def get_similar_books(book_id):
+    """Books similar to this one, best match first.
+
+    Books liked by the same readers come first (``source: likes``); books
+    with a similar description, author and genre fill the rest of the list
+    (``source: content``), so new books without reviews get neighbours too.
+    ``?source=likes`` or ``?source=content`` returns only one kind.
+    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), TOP_K))
+    source = request.args.get('source', 'all')
+    if source not in ('all', 'likes', 'content'):
+        return jsonify({'error': 'source must be all, likes or content'}), 400
+    
+    books = []
+    if source != 'content':
+        rows = (
+            db.session.query(*(BOOK_FIELDS[name] for name in LIST_FIELDS), BookSimilarity.score, BookSimilarity.co_likes)
+            .join(BookSimilarity, BookSimilarity.similar_id == Book.id)
+            .filter(BookSimilarity.book_id == book_id)
+            .order_by(BookSimilarity.score.desc(), BookSimilarity.similar_id)
+            .limit(limit)
+        )
+        for row in rows:
+            book = book_row_dict(LIST_FIELDS, row)
+            book.update(score=round(row.score, 4), co_likes=row.co_likes, source='likes')
+            books.append(book)
+    
+    if source != 'likes' and len(books) < limit:
+        seen = {book['id'] for book in books}
+        matches = get_content_index().similar([book_id], limit + len(seen))[book_id]
+        scores = {similar_id: score for similar_id, score in matches if similar_id not in seen}
+        ranked = sorted(scores, key=lambda similar_id: -scores[similar_id])[:limit - len(books)]
+        if ranked:
+            rows = {row.id: row for row in book_query(LIST_FIELDS).filter(Book.id.in_(ranked))}
+            for similar_id in ranked:
+                if similar_id in rows:
+                    book = book_row_dict(LIST_FIELDS, rows[similar_id])
+                    book.update(score=round(scores[similar_id], 4), source='content')
+                    books.append(book)
+    return jsonify({'book_id': book_id, 'books': books})
+
+def get_content_index():
+    """The app's content index. A missing one is built in the background; until
+    then it only knows books added since"""
+    index = current_app.extensions['content_index']
+    if not index.exists():
+        build_content_index_in_background()
+    return index
+
+def build_content_index_in_background(replace=False):
+    """Build the content index on a background thread, unless it exists or, with ``replace``, always"""
+    app = current_app._get_current_object()
+    def build():
+        try:
+            with app.app_context():
+                build_content_index()
+        except Exception:
+            app.logger.exception('Building the content index failed')
+    app.extensions['content_index'].build_in_background(build, replace)
+
+@api.route('/api/suggest', methods=['GET'])
+@query_budget(2)
+def get_suggestions():
+    """Typeahead: books whose title or author words start with the words of ``q``, most reviewed first"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 8, type=int)
+    suggestions = current_app.extensions['suggest'].suggest(query, limit)
+    return jsonify({'q': query, 'suggestions': [
+        {'id': book_id, 'title': title, 'author': author} for book_id, title, author in suggestions
+    ]})
+
+def load_suggestions(after_id):
+    """Rows for the typeahead index: every book with an id above ``after_id``"""
+    return (
+        db.session.query(Book.id, Book.title, Book.author, Book.review_count, db.func.coalesce(Book.rating, 0.0))
+        .filter(Book.id > after_id)
+        .yield_per(5000)
+    )
+
+@api.route('/api/leaderboards/top-rated', methods=['GET'])
+@query_budget(2)
+def get_top_rated():
+    """Books with the best Bayesian-average rating, optionally within one ``genre``"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config['MAX_PAGE_SIZE']))
+    current_leaderboards()
+    query = (
+        db.session.query(*(BOOK_FIELDS[name] for name in LIST_FIELDS), BookScore.score)
+        .select_from(BookScore)
+        .join(Book, Book.id == BookScore.book_id)
+    )
+    genre = request.args.get('genre')
+    if genre:
+        query = query.filter(BookScore.genre_id == db.session.query(Genre.id).filter(Genre.name == genre).scalar_subquery())
+    rows = query.order_by(BookScore.score.desc(), BookScore.book_id.desc()).limit(limit)
+    return jsonify({'genre': genre, 'books': leaderboard_rows(rows)})
+
+@api.route('/api/leaderboards/trending', methods=['GET'])
+@query_budget(2)
+def get_trending():
+    """Books with the most, and best rated, reviews in the last ``days`` days"""
+    days = request.args.get('days', leaderboards.TRENDING_WINDOWS[0], type=int)
+    if days not in leaderboards.TRENDING_WINDOWS:
+        windows = ', '.join(str(window) for window in leaderboards.TRENDING_WINDOWS)
+        return jsonify({'error': f'days must be one of {windows}'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config['MAX_PAGE_SIZE']))
+    current_leaderboards()
+    rows = (
+        db.session.query(*(BOOK_FIELDS[name] for name in LIST_FIELDS), TrendingScore.score, TrendingScore.review_count)
+        .select_from(TrendingScore)
+        .join(Book, Book.id == TrendingScore.book_id)
+        .filter(TrendingScore.days == days)
+        .order_by(TrendingScore.score.desc(), TrendingScore.book_id.desc())
+        .limit(limit)
+        .all()
+    )
+    books = leaderboard_rows(rows)
+    for book, row in zip(books, rows):
+        book['recent_reviews'] = row.review_count
+    return jsonify({'days': days, 'books': books})
+
+def current_leaderboards():
+    """Roll the leaderboards over to today if a new UTC day has started since the last write"""
+    state = leaderboards.current_state(db.session.connection())
+    today = datetime.utcnow().date()
+    if leaderboards.is_current(state, today):
+        return
+    def write(batch):
+        if not leaderboards.is_current(leaderboards.current_state(db.session.connection()), today):
+            leaderboards.rebuild(db.session.connection(), today)
+    submit_write(write)
+
+def leaderboard_rows(rows):
+    books = []
+    for row in rows:
+        book = book_row_dict(LIST_FIELDS, row)
+        book['score'] = round(row.score, 3)
+        books.append(book)
+    return books
+
+@api.route('/api/covers/<int:book_id>', methods=['GET'])
+@query_budget(1)
+def get_cover(book_id):
+    """Serve a book's cover from the local cache, resized for ``size`` (small, medium or full)"""
+    size = request.args.get('size', 'full')
+    if size not in COVER_SIZES:
+        return jsonify({'error': f'size must be one of {", ".join(COVER_SIZES)}'}), 400
+    url = db.session.execute(db.select(Book.cover_image).where(Book.id == book_id)).scalar()
+    if not url:
+        return jsonify({'error': 'No cover for this book'}), 404
+    try:
+        path, content_type, digest = current_app.extensions['covers'].get(url, size)
+    except CoverFetchError as e:
+        return jsonify({'error': str(e)}), 502
+    response = send_file(path, mimetype=content_type, etag=digest, max_age=current_app.config['COVER_MAX_AGE'])
+    response.cache_control.public = True
+    return response
+
+@api.route('/api/books', methods=['POST'])
+@query_budget(3)
 def create_book():
     """Create a new book"""
     data = request.get_json()
+    isbn = data.get('isbn')
+    if isbn:
+        try:
+            isbn = normalize_isbn(isbn)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     
     book = Book(
         title=data.get('title'),
         author=data.get('author'),
-        isbn=data.get('isbn'),
+        isbn=isbn or None,
         description=data.get('description'),
         cover_image=data.get('cover_image'),
         genre=data.get('genre'),
@@ -134,119 +744,452 @@ def create_book():
     )
     
     db.session.add(book)
+    bump_data_version()
     db.session.commit()
+    current_app.extensions['content_index'].add([(book.id, book.description, book.genre, book.author)])
+    current_app.extensions['suggest'].add(book.id, book.title, book.author)
     return jsonify(book.to_dict()), 201
 
-@app.route('/api/reviews', methods=['POST'])
+@api.route('/api/reviews', methods=['POST'])
+# 10 statements, 12 when it rolls the leaderboards over to a new day
+@query_budget(12)
 def create_review():
     """Create a new review"""
     data = request.get_json()
     
-    book = Book.query.get_or_404(data.get('book_id'))
+    def write(batch):
+        if db.session.get(Book, data.get('book_id')) is None:
+            return None
+        review = Review(
+            book_id=data.get('book_id'),
+            reviewer_name=data.get('reviewer_name'),
+            rating=data.get('rating'),
+            comment=data.get('comment')
+        )
+        db.session.add(review)
+        db.session.flush()
+        batch.review_delta(review.book_id, 1, review.rating)
+        batch.record('reviews_changed', (review.book_id, review.created_at, 1, review.rating))
+        if review.rating >= LIKE_THRESHOLD:
+            batch.record('likes_changed', (review.reviewer_name, review.book_id))
+        return review.to_dict()
     
-    review = Review(
-        book_id=data.get('book_id'),
-        reviewer_name=data.get('reviewer_name'),
-        rating=data.get('rating'),
-        comment=data.get('comment')
-    )
+    review_data = submit_write(write)
+    if review_data is None:
+        return jsonify({'error': 'Book not found'}), 404
+    return jsonify(review_data), 201
+
+@api.route('/api/books/bulk', methods=['POST'])
+def bulk_import_books():
+    """Import many books from an NDJSON or CSV body, upserting on isbn.
+
+    The body is parsed as it streams in and written in batches of
+    ``batch_size`` rows (default BULK_BATCH_SIZE). Rows that fail validation
+    or insertion are reported by line number without aborting the import.
+    """
+    body_format = request.args.get('format') or request.mimetype
+    if body_format in ('ndjson', 'application/x-ndjson', 'application/jsonl'):
+        parse = iter_ndjson
+    elif body_format in ('csv', 'text/csv'):
+        parse = iter_csv
+    else:
+        return jsonify({'error': 'Send NDJSON (application/x-ndjson) or CSV (text/csv)'}), 415
     
-    db.session.add(review)
+    batch_size = request.args.get('batch_size', current_app.config['BULK_BATCH_SIZE'], type=int)
+    lines = (line.decode('utf-8', errors='replace') for line in request.stream)
+    summary = import_books(db.session, Book.__table__, parse(lines), max(1, batch_size))
+    bump_data_version()
     db.session.commit()
+    leaderboards.sync_genres(db.session.connection())
+    db.session.commit()
+    # Rebuilt with document frequencies that include the import; the old index serves until then
+    build_content_index_in_background(replace=True)
+    return jsonify(summary)
+
+@api.route('/api/reviews', methods=['GET'])
+@query_budget(2)
+def get_reviews():
+    """Get one reviewer's reviews, newest first, with each book's title and cover"""
+    reviewer = request.args.get('reviewer')
+    if not reviewer:
+        return jsonify({'error': 'reviewer is required'}), 400
     
-    # Update book rating
-    update_book_rating(book.id)
+    query = (
+        db.session.query(Review, Book.title, Book.cover_image)
+        .join(Book, Review.book_id == Book.id)
+        .filter(Review.reviewer_name == reviewer)
+        .order_by(Review.id.desc())
+    )
+    limit = request.args.get('limit', 15, type=int)
+    try:
+        rows, next_cursor = keyset_page(query, (Review.id,), request.args.get('after'), limit, descending=True)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
-    return jsonify(review.to_dict()), 201
+    reviews = []
+    for review, book_title, book_cover in rows:
+        review_data = review.to_dict()
+        review_data['book_title'] = book_title
+        review_data['book_cover'] = book_cover
+        reviews.append(review_data)
+    
+    result = {'reviews': reviews, 'next_cursor': next_cursor}
+    if request.args.get('count', type=int):
+        result['total'] = Review.query.filter_by(reviewer_name=reviewer).count()
+    return jsonify(result)
 
-@app.route('/api/reviews/<int:review_id>', methods=['DELETE'])
+@api.route('/api/reviews/<int:review_id>', methods=['DELETE'])
+# 10 statements, 12 when it rolls the leaderboards over to a new day
+@query_budget(12)
 def delete_review(review_id):
     """Delete a review"""
-    review = Review.query.get_or_404(review_id)
-    book_id = review.book_id
-    db.session.delete(review)
-    db.session.commit()
-    update_book_rating(book_id)
+    def write(batch):
+        review = db.session.get(Review, review_id)
+        if review is None:
+            return False
+        db.session.delete(review)
+        db.session.flush()
+        batch.review_delta(review.book_id, -1, -review.rating)
+        batch.record('reviews_changed', (review.book_id, review.created_at, -1, -review.rating))
+        if review.rating >= LIKE_THRESHOLD:
+            batch.record('likes_changed', (review.reviewer_name, review.book_id))
+        return True
+    
+    if not submit_write(write):
+        return jsonify({'error': 'Review not found'}), 404
     return '', 204
 
-@app.route('/api/journal', methods=['GET'])
+@api.route('/api/journal', methods=['GET'])
+@query_budget(1)
 def get_journal_entries():
-    """Get all journal entries"""
+    """Get journal entries.
+
+    Returns the whole shelf as a JSON array by default, a cursor-paginated
+    page when ``after`` or ``limit`` is given, or streams one entry per line
+    as NDJSON for ``format=ndjson`` (or an ``application/x-ndjson`` Accept).
+    """
     status = request.args.get('status')
-    query = JournalEntry.query
+    query = (
+        JournalEntry.query
+        .options(db.joinedload(JournalEntry.book).load_only(Book.title))
+        .order_by(JournalEntry.id)
+    )
     
     if status:
         query = query.filter_by(status=status)
     
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for entry in query.yield_per(current_app.config['STREAM_BATCH_SIZE']):
+                yield current_app.json.dumps(entry.to_dict()) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    if 'after' in request.args or 'limit' in request.args:
+        limit = request.args.get('limit', 15, type=int)
+        try:
+            entries, next_cursor = keyset_page(query, (JournalEntry.id,), request.args.get('after'), limit)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({
+            'entries': [entry.to_dict() for entry in entries],
+            'next_cursor': next_cursor
+        })
+    
     entries = [entry.to_dict() for entry in query.all()]
     return jsonify(entries)
 
-@app.route('/api/journal', methods=['POST'])
+@api.route('/api/journal', methods=['POST'])
+@query_budget(4)
 def create_journal_entry():
     """Create a new journal entry"""
     data = request.get_json()
     
-    # Check if entry already exists for this book
-    existing = JournalEntry.query.filter_by(book_id=data.get('book_id')).first()
-    if existing:
-        return jsonify({'error': 'Entry already exists for this book'}), 400
-    
-    entry = JournalEntry(
-        book_id=data.get('book_id'),
-        user_notes=data.get('user_notes'),
-        status=data.get('status', 'want-to-read'),
-        rating=data.get('rating')
-    )
+    def write(batch):
+        # Check if entry already exists for this book
+        if JournalEntry.query.filter_by(book_id=data.get('book_id')).first():
+            return None
+        entry = JournalEntry(
+            book_id=data.get('book_id'),
+            user_notes=data.get('user_notes'),
+            status=data.get('status', 'want-to-read'),
+            rating=data.get('rating')
+        )
+        db.session.add(entry)
+        db.session.flush()
+        batch.shelf_changed = True
+        return entry.to_dict()
     
-    db.session.add(entry)
-    db.session.commit()
-    return jsonify(entry.to_dict()), 201
+    entry_data = submit_write(write)
+    if entry_data is None:
+        return jsonify({'error': 'Entry already exists for this book'}), 400
+    return jsonify(entry_data), 201
 
-@app.route('/api/journal/<int:entry_id>', methods=['PUT'])
+@api.route('/api/journal/<int:entry_id>', methods=['PUT'])
+@query_budget(4)
 def update_journal_entry(entry_id):
     """Update a journal entry"""
-    entry = JournalEntry.query.get_or_404(entry_id)
     data = request.get_json()
     
-    if 'user_notes' in data:
-        entry.user_notes = data['user_notes']
-    if 'status' in data:
-        entry.status = data['status']
-    if 'rating' in data:
-        entry.rating = data['rating']
+    def write(batch):
+        entry = db.session.get(JournalEntry, entry_id)
+        if entry is None:
+            return None
+        if 'user_notes' in data:
+            entry.user_notes = data['user_notes']
+        if 'status' in data:
+            entry.status = data['status']
+        if 'rating' in data:
+            entry.rating = data['rating']
+        entry.updated_at = datetime.utcnow()
+        db.session.flush()
+        batch.shelf_changed = True
+        return entry.to_dict()
     
-    entry.updated_at = datetime.utcnow()
-    db.session.commit()
-    return jsonify(entry.to_dict())
+    entry_data = submit_write(write)
+    if entry_data is None:
+        return jsonify({'error': 'Journal entry not found'}), 404
+    return jsonify(entry_data)
 
-@app.route('/api/journal/<int:entry_id>', methods=['DELETE'])
+@api.route('/api/journal/<int:entry_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_journal_entry(entry_id):
     """Delete a journal entry"""
-    entry = JournalEntry.query.get_or_404(entry_id)
-    db.session.delete(entry)
-    db.session.commit()
+    def write(batch):
+        entry = db.session.get(JournalEntry, entry_id)
+        if entry is None:
+            return False
+        db.session.delete(entry)
+        batch.shelf_changed = True
+        return True
+    
+    if not submit_write(write):
+        return jsonify({'error': 'Journal entry not found'}), 404
     return '', 204
 
-@app.route('/api/genres', methods=['GET'])
+@api.route('/api/genres', methods=['GET'])
+@query_budget(2)
+@response_cache.cached(current_data_version)
 def get_genres():
-    """Get all unique genres"""
-    genres = db.session.query(Book.genre).distinct().filter(Book.genre.isnot(None)).all()
-    return jsonify([g[0] for g in genres if g[0]])
+    """Get all genres that have at least one book"""
+    genres = db.session.query(Genre.name).filter(Genre.book_count > 0).order_by(Genre.name)
+    return jsonify([name for name, in genres])
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
+@query_budget(4)
+def get_stats():
+    """Get reading dashboard counters, optionally with one reviewer's review count"""
+    reviewer = request.args.get('reviewer')
+    # Read before the counters, so an entry is never older than its key
+    versions = db.session.get(DataVersion, 1)
+    key = (versions.version, versions.shelf_version, reviewer) if versions else (0, 0, reviewer)
+    cached = _stats_cache.get(key)
+    if cached is not None:
+        return jsonify(cached)
+    
+    by_status = dict(
+        db.session.query(JournalEntry.status, db.func.count(JournalEntry.id))
+        .group_by(JournalEntry.status)
+        .all()
+    )
+    stats = {
+        'shelf': {'total': sum(by_status.values()), 'by_status': by_status},
+        'reviews': {'total': db.session.query(db.func.count(Review.id)).scalar()}
+    }
+    if reviewer:
+        stats['reviews']['reviewer'] = (
+            db.session.query(db.func.count(Review.id))
+            .filter(Review.reviewer_name == reviewer)
+            .scalar()
+        )
+    
+    if len(_stats_cache) >= _STATS_CACHE_SIZE:
+        _stats_cache.clear()
+    _stats_cache[key] = stats
+    return jsonify(stats)
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'ok'})
 
-def update_book_rating(book_id):
-    """Update a book's average rating based on reviews"""
-    book = Book.query.get(book_id)
-    if book and book.reviews:
-        avg_rating = sum(r.rating for r in book.reviews) / len(book.reviews)
-        book.rating = avg_rating
-        db.session.commit()
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL and cache metrics for this process in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Dashboard counters served by get_stats(), keyed by the data and shelf
+# versions and the reviewer name, so writes in any worker make them stale
+_stats_cache = {}
+_STATS_CACHE_SIZE = 1024
+
+def genre_facets(ranked=None):
+    """Per-genre book counts, restricted to the search matches in ``ranked`` if given.
+
+    Without a search these are the maintained Genre.book_count counters;
+    with one it is a single GROUP BY over the matching books.
+    """
+    if ranked is None:
+        rows = db.session.query(Genre.name, Genre.book_count).filter(Genre.book_count > 0)
+        rows = rows.order_by(Genre.book_count.desc(), Genre.name)
+    else:
+        count = db.func.count(Book.id)
+        rows = (
+            db.session.query(Genre.name, count)
+            .join(Book, Book.genre_id == Genre.id)
+            .join(ranked, Book.id == ranked.c.book_id)
+            .group_by(Genre.id)
+            .order_by(count.desc(), Genre.name)
+        )
+    return [{'genre': name, 'count': count} for name, count in rows]
+
+def encode_cursor(values):
+    """Pack a row's sort-key values into an opaque, URL-safe cursor"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Unpack a cursor made by encode_cursor(), raising ValueError if malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError('malformed cursor') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('malformed cursor')
+    return values
+
+def keyset_page(query, sort_keys, after, limit, descending=False):
+    """Fetch the page of ``query`` that follows cursor ``after``.
+
+    ``query`` must already be ordered by ``sort_keys`` (ascending, or
+    descending when ``descending`` is set), the last of which has to be
+    unique. Returns the items and the cursor for the next page, or None when
+    this is the last one.
+    """
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    if after:
+        values = decode_cursor(after, len(sort_keys))
+        # Row-value comparison (a, b) > (x, y), spelled out for portability
+        condition = None
+        for key, value in reversed(list(zip(sort_keys, values))):
+            beyond = key < value if descending else key > value
+            condition = beyond if condition is None else db.or_(beyond, db.and_(key == value, condition))
+        query = query.filter(condition)
+    width = len(query.column_descriptions)
+    # A query for one model yields instances; anything else yields tuples
+    single_entity = width == 1 and isinstance(query.column_descriptions[0]['expr'], type)
+    rows = query.add_columns(*sort_keys).limit(limit + 1).all()
+    next_cursor = encode_cursor(list(rows[limit - 1][width:])) if len(rows) > limit else None
+    items = [row[0] if single_entity else tuple(row[:width]) for row in rows[:limit]]
+    return items, next_cursor
+
+def submit_write(job):
+    """Run ``job(batch)`` in the next group commit and return its result once committed"""
+    return current_app.extensions['group_commit'].submit(job)
+
+def replay_write_statements(statements, shared):
+    """Charge ``(seconds, statement)`` records run on the group-commit writer to the current request.
+
+    The batch's ``shared`` statements depend on what else was in the batch,
+    so they count in metrics but not against the route's query budget.
+    """
+    metrics.record_statements(statements + shared)
+    record_statements(statement for _, statement in statements)
+
+def apply_write_batch(batch):
+    """Apply a group commit's aggregate changes inside its transaction"""
+    for book_id, (count_delta, rating_delta) in batch.review_deltas.items():
+        apply_review_delta(book_id, count_delta, rating_delta)
+    if batch.events['reviews_changed']:
+        leaderboards.apply_review_changes(db.session.connection(), batch.events['reviews_changed'], datetime.utcnow().date())
+    bump_data_version(catalog=batch.catalog_changed, shelf=batch.shelf_changed)
+
+def finish_write_batch(batch):
+    """Start the work a committed group commit leaves for later"""
+    if batch.events['likes_changed']:
+        current_app.extensions['similar_refresher'].add(batch.events['likes_changed'])
+
+def store_neighbours(book_ids, rows, scores=()):
+    """Swap in recomputed "also liked" neighbours and scores (see SimilarRefresher)"""
+    def write(batch):
+        store_similar(db.session.connection(), book_ids, rows, scores)
+        batch.catalog_changed = True
+    submit_write(write)
+
+def apply_review_delta(book_id, count_delta, rating_delta):
+    """Adjust a book's stored review aggregates in the current transaction"""
+    new_count = Book.review_count + count_delta
+    new_sum = Book.rating_sum + rating_delta
+    db.session.execute(
+        db.update(Book)
+        .where(Book.id == book_id)
+        .values(
+            review_count=new_count,
+            rating_sum=new_sum,
+            rating=db.case((new_count > 0, db.cast(new_sum, db.Float) / new_count), else_=0.0)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def reconcile_book_aggregates():
+    """Recompute every book's review aggregates from the review table"""
+    reviews = db.select(Review.book_id).where(Review.book_id == Book.id)
+    count = reviews.with_only_columns(db.func.count(Review.id)).scalar_subquery()
+    total = reviews.with_only_columns(db.func.coalesce(db.func.sum(Review.rating), 0)).scalar_subquery()
+    average = reviews.with_only_columns(db.func.coalesce(db.func.avg(Review.rating), 0.0)).scalar_subquery()
+    result = db.session.execute(
+        db.update(Book)
+        .values(review_count=count, rating_sum=total, rating=average)
+        .execution_options(synchronize_session=False)
+    )
+    bump_data_version()
+    db.session.commit()
+    return result.rowcount
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables, indexes and triggers, e.g. before starting another WSGI server"""
+    db.create_all()
+    print('Database tables created')
+
+@click.command('reconcile-ratings')
+@with_appcontext
+def reconcile_ratings_command():
+    """Backfill review_count, rating_sum and rating from existing reviews"""
+    db.create_all()
+    updated = reconcile_book_aggregates()
+    print(f'Reconciled review aggregates for {updated} books')
+
+@click.command('rebuild-similar')
+@with_appcontext
+def rebuild_similar_command():
+    """Recompute every book's "also liked" neighbours from existing reviews"""
+    db.create_all()
+    rows = rebuild_similar(db.session.connection())
+    bump_data_version()
+    db.session.commit()
+    print(f'Stored {rows} book neighbours')
+
+@click.command('rebuild-content-index')
+@with_appcontext
+def rebuild_content_index_command():
+    """Rebuild the content-based similar books index from the catalog"""
+    db.create_all()
+    build_content_index()
+    print(f'Indexed {Book.query.count()} books in {current_app.extensions["content_index"].directory}')
+
+@click.command('rebuild-leaderboards')
+@with_appcontext
+def rebuild_leaderboards_command():
+    """Recompute the top-rated and trending leaderboards from stored reviews"""
+    db.create_all()
+    leaderboards.rebuild(db.session.connection(), datetime.utcnow().date())
+    db.session.commit()
+    print(f'Scored {BookScore.query.count()} reviewed books')
 
 if __name__ == '__main__':
+    # Single-process development server; use serve.py in production
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=False, port=5001, host='127.0.0.1')
@@ -0,0 +1,198 @@
+"""Per-endpoint micro-benchmarks at several catalog sizes.
+
+Each scale runs in its own process against its own generated database
+(built once with seed_synthetic.py and reused), driving the Flask test
+client and recording latency percentiles and SQL statements per request.
+
+    python benchmark.py                                  # 1k and 100k books
+    python benchmark.py --scales 1k 100k 1m --save baseline.json
+    python benchmark.py --compare baseline.json          # exit 1 on regression
+
+The response cache is off, so every request runs its queries; pass
+--response-cache to time cache hits instead.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(HERE, 'instance', 'bench')
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+SEED = 1234
+REVIEWS_PER_BOOK = 5
+JOURNAL_ENTRIES = 2000
+SEARCH_TERMS = ['garden', 'river', 'the last', 'nakamura', 'crimson kingdom', 'libr']
+GENRES = ['Fantasy', 'Mystery', 'Poetry']
+
+
+def database_path(scale):
+    return os.path.join(BENCH_DIR, f'bookify-{scale}.db')
+
+
+def build_cases(books, rng):
+    """The requests to time: name -> (method, callable returning url and JSON body)"""
+    from app import encode_cursor
+
+    per_page = 15
+    last_page = max(1, -(-books // per_page))
+    return {
+        'get_books': ('GET', lambda: ('/api/books?page=1', None)),
+        'get_books:deep_page': ('GET', lambda: (f'/api/books?page={last_page}', None)),
+        'get_books:cursor': ('GET', lambda: (
+            f'/api/books?limit={per_page}&after={encode_cursor([rng.randint(1, books)])}', None)),
+        'get_books:search': ('GET', lambda: (f'/api/books?search={rng.choice(SEARCH_TERMS)}', None)),
+        'get_books:genre': ('GET', lambda: (f'/api/books?genre={rng.choice(GENRES)}', None)),
+        'get_book': ('GET', lambda: (f'/api/books/{rng.randint(1, books)}', None)),
+        'get_journal_entries': ('GET', lambda: ('/api/journal', None)),
+        'get_journal_entries:page': ('GET', lambda: ('/api/journal?limit=50', None)),
+        'get_genres': ('GET', lambda: ('/api/genres', None)),
+        'create_review': ('POST', lambda: ('/api/reviews', {
+            'book_id': rng.randint(1, books), 'reviewer_name': 'benchmark',
+            'rating': rng.randint(1, 5), 'comment': 'Benchmark review',
+        })),
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_scale(scale, iterations, warmup, only, response_cache=False):
+    """Benchmark one scale in this process and return its results"""
+    from sqlalchemy import event
+
+    from app import create_app, db
+    from seed_synthetic import seed_synthetic
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database_path(scale),
+        'RESPONSE_CACHE_SIZE': 512 if response_cache else 0,
+    })
+    books = SCALES[scale]
+    if not os.path.exists(database_path(scale)):
+        print(f'[{scale}] generating database...', file=sys.stderr)
+        seed_synthetic(books, books * REVIEWS_PER_BOOK, JOURNAL_ENTRIES, seed=SEED, app=app,
+                       log=lambda message: print(f'[{scale}] {message}', file=sys.stderr))
+
+    statements = [0]
+    with app.app_context():
+        # Upgrade a database generated by an older version in place
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args, **kwargs: statements.__setitem__(0, statements[0] + 1))
+
+    client = app.test_client()
+    rng = random.Random(SEED)
+    results = {}
+    for name, (method, make_request) in build_cases(books, rng).items():
+        if only and name not in only:
+            continue
+        timings = []
+        queries = []
+        for i in range(warmup + iterations):
+            url, body = make_request()
+            statements[0] = 0
+            started = time.perf_counter()
+            response = client.open(url, method=method, json=body)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: {method} {url} returned {response.status_code}')
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(statements[0])
+        results[name] = {
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p90_ms': round(percentile(timings, 0.90), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': round(statistics.fmean(queries), 2),
+            'max_queries': max(queries),
+        }
+        print(f'[{scale}] {name}: p50 {results[name]["p50_ms"]}ms', file=sys.stderr)
+    return results
+
+
+def run_in_subprocess(scale, args):
+    """Run one scale in a fresh interpreter so scales don't share caches or memory"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', scale,
+               '--iterations', str(args.iterations), '--warmup', str(args.warmup)]
+    if args.only:
+        command += ['--only'] + args.only
+    if args.response_cache:
+        command.append('--response-cache')
+    output = subprocess.run(command, cwd=HERE, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(output.stdout)
+
+
+def print_report(results):
+    header = f'{"scale":<6} {"endpoint":<26} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"queries":>8}'
+    print(header)
+    print('-' * len(header))
+    for scale, endpoints in results.items():
+        for name, r in endpoints.items():
+            print(f'{scale:<6} {name:<26} {r["p50_ms"]:>9.2f} {r["p90_ms"]:>9.2f} {r["p99_ms"]:>9.2f} {r["queries"]:>8.1f}')
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against ``baseline`` and return the list of regressions"""
+    regressions = []
+    print(f'\nCompared with baseline (tolerance {tolerance:.0%}):')
+    for scale, endpoints in results.items():
+        for name, r in endpoints.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                print(f'  {scale} {name}: new')
+                continue
+            ratio = r['p50_ms'] / base['p50_ms'] if base['p50_ms'] else 1.0
+            flags = []
+            if ratio > 1 + tolerance:
+                flags.append('SLOWER')
+            if r['max_queries'] > base['max_queries']:
+                flags.append(f'QUERIES {base["max_queries"]} -> {r["max_queries"]}')
+            print(f'  {scale} {name}: p50 {base["p50_ms"]:.2f} -> {r["p50_ms"]:.2f}ms ({ratio:.2f}x) {" ".join(flags)}')
+            if flags:
+                regressions.append((scale, name, flags))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Bookify API at several data scales')
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['1k', '100k'])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='endpoint names to run (default all)')
+    parser.add_argument('--response-cache', action='store_true', help='keep the response cache on and time cache hits')
+    parser.add_argument('--save', metavar='FILE', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown (default 0.25)')
+    parser.add_argument('--worker', choices=SCALES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_scale(args.worker, args.iterations, args.warmup, args.only, args.response_cache), sys.stdout)
+        return 0
+
+    results = {scale: run_in_subprocess(scale, args) for scale in args.scales}
+    print_report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nSaved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Streaming catalog import: parse NDJSON or CSV rows and upsert them in batches."""
+import csv
+import json
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from isbn import normalize_isbn
+
+# Columns a catalog row may set. Review aggregates are never imported.
+IMPORT_COLUMNS = ('title', 'author', 'isbn', 'description', 'cover_image', 'genre', 'publication_year')
+
+
+def iter_ndjson(lines):
+    """Yield (line_number, row) for each non-blank NDJSON line.
+
+    A line that is not a JSON object yields a ValueError in place of the row.
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError('expected a JSON object')
+            continue
+        yield number, row
+
+
+def iter_csv(lines):
+    """Yield (line_number, row) for each CSV data row, using the header row for keys"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def clean_row(row):
+    """Validate one imported row and return the column values to write"""
+    values = {}
+    for column in IMPORT_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str):
+            value = value.strip() or None
+        values[column] = value
+    for column in ('title', 'author'):
+        if not values[column]:
+            raise ValueError(f'{column} is required')
+    if values['publication_year'] is not None:
+        try:
+            values['publication_year'] = int(values['publication_year'])
+        except (TypeError, ValueError):
+            raise ValueError('publication_year must be an integer')
+    values['isbn13'] = None
+    if values['isbn'] is not None:
+        values['isbn'] = values['isbn13'] = normalize_isbn(values['isbn'])
+    return values
+
+
+def upsert_statement(table):
+    """INSERT ... ON CONFLICT (isbn) DO UPDATE, keeping existing values for missing fields"""
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.isbn],
+        set_={
+            column: func.coalesce(stmt.excluded[column], table.c[column])
+            for column in IMPORT_COLUMNS if column != 'isbn'
+        }
+    )
+
+
+def import_books(session, table, rows, batch_size=1000):
+    """Upsert ``rows`` of (line_number, row) into ``table`` in batches.
+
+    Each batch is written with one executemany and committed on its own, so
+    a bad row never aborts the rows around it. Returns a summary with the
+    inserted and updated counts and a per-line list of errors.
+    """
+    summary = {'inserted': 0, 'updated': 0, 'batches': 0, 'errors': []}
+    batch = []
+    for number, row in rows:
+        if isinstance(row, Exception):
+            summary['errors'].append({'line': number, 'error': str(row)})
+            continue
+        try:
+            batch.append((number, clean_row(row)))
+        except ValueError as e:
+            summary['errors'].append({'line': number, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            _write_batch(session, table, batch, summary)
+            batch = []
+    if batch:
+        _write_batch(session, table, batch, summary)
+    return summary
+
+
+def _write_batch(session, table, batch, summary):
+    isbns = {values['isbn'] for _, values in batch if values['isbn'] is not None}
+    existing = set()
+    if isbns:
+        existing = set(session.scalars(select(table.c.isbn).where(table.c.isbn.in_(isbns))))
+    stmt = upsert_statement(table)
+    try:
+        session.execute(stmt, [values for _, values in batch])
+        session.commit()
+        written = batch
+    except SQLAlchemyError:
+        # Retry row by row so one failing row is reported instead of the batch
+        session.rollback()
+        written = []
+        for number, values in batch:
+            try:
+                with session.begin_nested():
+                    session.execute(stmt, values)
+                written.append((number, values))
+            except SQLAlchemyError as e:
+                summary['errors'].append({'line': number, 'error': str(getattr(e, 'orig', None) or e).splitlines()[0]})
+        session.commit()
+
+    summary['batches'] += 1
+    for _, values in written:
+        if values['isbn'] in existing:
+            summary['updated'] += 1
+        else:
+            summary['inserted'] += 1
+            if values['isbn'] is not None:
+                existing.add(values['isbn'])
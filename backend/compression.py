@@ -0,0 +1,88 @@
+"""gzip / brotli response compression.
+
+Responses are compressed according to the client's Accept-Encoding,
+preferring brotli when the optional ``brotli`` package is installed. Only
+text-like bodies of at least ``COMPRESS_MIN_SIZE`` bytes are compressed.
+
+Most bodies are compressed only once. The response cache stores each
+encoded variant next to the plain body, and the frontend compresses its
+assets at startup. The after-request hook installed by init_compression()
+handles everything else: uncached API responses such as review lists and
+journal pages.
+"""
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'image/svg+xml', 'text/css', 'text/html', 'text/javascript', 'text/plain',
+}
+
+# Quality per encoding: bodies compressed on every request, bodies stored in
+# the response cache, and static assets compressed once at startup
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+CACHED_LEVELS = {'br': 8, 'gzip': 9}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding():
+    """The best encoding the current request accepts, or None for identity"""
+    accepted = request.accept_encodings
+    for encoding in available_encodings():
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def compress(body, encoding, level=None):
+    """``body`` encoded with ``encoding`` ('br' or 'gzip')"""
+    if level is None:
+        level = DYNAMIC_LEVELS[encoding]
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output, and so any ETag derived from it, deterministic
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def is_compressible(mimetype, size):
+    return mimetype in COMPRESSIBLE_TYPES and size >= current_app.config['COMPRESS_MIN_SIZE']
+
+
+def set_encoded_body(response, body, encoding):
+    """Make ``response`` carry ``body`` encoded as ``encoding``, with a matching ETag"""
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+
+
+def compress_response(response):
+    """after_request hook compressing eligible responses that aren't encoded yet"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = negotiate_encoding()
+    if encoding is None or len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    set_encoded_body(response, compress(body, encoding), encoding)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -0,0 +1,369 @@
+"""Content-based similar books, from each book's description, genre and author.
+
+This gives new books neighbours before anyone has reviewed them. Every book
+becomes a sparse TF-IDF vector over hashed features:
+
+- words of its description
+- its author, as one feature
+- its genre, as one feature
+
+Features are hashed into ``DIMENSIONS`` buckets, so no vocabulary has to be
+stored. The vectors are L2-normalized and cut to their ``MAX_TERMS``
+heaviest features. The neighbours of a book are the books with the highest
+cosine similarity. They are found with one sparse matrix-vector product over
+an inverted index.
+
+The index lives in two files in ``directory``:
+
+``base``
+    An immutable snapshot of every vector and the inverted index. It is
+    memory-mapped, so worker processes share one copy through the page
+    cache instead of each loading its own.
+``delta``
+    An append-only log of books added since the snapshot. Each process
+    replays the log's new tail before a query. Once the log grows past
+    ``COMPACT_BYTES`` it is merged into a new snapshot.
+
+Writers take an exclusive lock on ``lock``. New files replace old ones by
+rename, so readers never see a half-written file.
+
+A missing index is built on a background thread by build_in_background(),
+once per process at a time, so queries never wait for it.
+"""
+import bisect
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+from array import array
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; writes are then unlocked
+    fcntl = None
+
+DIMENSIONS = 1 << 18
+MAX_TERMS = 64
+# Features in more than this share of books carry no signal and are dropped
+MAX_DOC_FREQUENCY = 0.5
+AUTHOR_WEIGHT = 2.0
+GENRE_WEIGHT = 1.5
+COMPACT_BYTES = 1 << 20
+
+_MAGIC = b'BKCIDX01'
+_HEADER = struct.Struct('<8sIII')
+_RECORD = struct.Struct('<ii')
+_WORD = re.compile(r'[a-z]{3,}')
+_STOPWORDS = frozenset("""
+    about after again all also and any are because been before being but can could did does doing down during each
+    for from further had has have her here hers him his how into its just more most not now off once only other our
+    out over own same she should some such than that the their them then there these they this those through too
+    under until very was were what when where which while who whom why will with would you your
+""".split())
+
+
+def raw_features(description, genre, author):
+    """Unweighted hashed term frequencies of one book, as {bucket: tf}"""
+    counts = defaultdict(int)
+    for word in _WORD.findall((description or '').lower()):
+        if word not in _STOPWORDS:
+            counts[_bucket(word)] += 1
+    features = {bucket: 1 + math.log(count) for bucket, count in counts.items()}
+    if author:
+        features[_bucket('author:' + author.strip().lower())] = AUTHOR_WEIGHT
+    if genre:
+        features[_bucket('genre:' + genre.strip().lower())] = GENRE_WEIGHT
+    return features
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode('utf-8')) & (DIMENSIONS - 1)
+
+
+def weigh(features, idf):
+    """TF-IDF weight ``features``, keeping the MAX_TERMS heaviest, L2-normalized, as (terms, weights)"""
+    weighted = [(tf * idf[bucket], bucket) for bucket, tf in features.items()]
+    top = [(weight, bucket) for weight, bucket in heapq.nlargest(MAX_TERMS, weighted) if weight > 0]
+    norm = math.sqrt(sum(weight * weight for weight, _ in top)) or 1.0
+    top.sort(key=lambda item: item[1])
+    return array('i', [bucket for _, bucket in top]), array('f', [weight / norm for weight, _ in top])
+
+
+class ContentIndex:
+    """Hashed TF-IDF vectors of every book with a memory-mapped inverted index"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.base_path = os.path.join(directory, 'base')
+        self.delta_path = os.path.join(directory, 'delta')
+        self.lock_path = os.path.join(directory, 'lock')
+        self.build_lock_path = os.path.join(directory, 'build.lock')
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._building = False
+        self._rebuild = False
+        self._base = None
+        self._base_id = None
+        self._delta_id = None
+        self._delta_offset = 0
+        self._delta_docs = {}
+        self._delta_postings = defaultdict(dict)
+
+    def exists(self):
+        return os.path.exists(self.base_path)
+
+    def build(self, books):
+        """Replace the index with the ``(book_id, description, genre, author)`` rows in ``books``"""
+        with self._exclusive():
+            started = _file_id(self.delta_path)
+        books = [(book_id, raw_features(description, genre, author)) for book_id, description, genre, author in books]
+        document_frequency = defaultdict(int)
+        for _, features in books:
+            for bucket in features:
+                document_frequency[bucket] += 1
+        idf = array('f', [math.log(1 + len(books)) + 1]) * DIMENSIONS
+        for bucket, frequency in document_frequency.items():
+            common = len(books) >= 20 and frequency > MAX_DOC_FREQUENCY * len(books)
+            idf[bucket] = 0.0 if common else math.log((1 + len(books)) / (1 + frequency)) + 1
+        with self._exclusive():
+            self._write_base(idf, {book_id: weigh(features, idf) for book_id, features in books})
+            # Keep books added while ``books`` was being read
+            self._write_file(self.delta_path, self._delta_since(started))
+
+    def build_in_background(self, build, replace=False):
+        """Run ``build()`` on a background thread if the index is missing, or always with ``replace``.
+
+        Returns at once. Calls made while a build is running start no
+        thread of their own; one with ``replace`` queues a single rebuild
+        after it. Processes take turns through ``build.lock``, and skip a
+        missing-index build that another process finished meanwhile.
+        """
+        with self._lock:
+            if self._building:
+                self._rebuild = self._rebuild or replace
+                return
+            if not replace and self.exists():
+                return
+            self._building = True
+        threading.Thread(target=self._run_build, args=(build, replace), name='content-index-build', daemon=True).start()
+
+    def _run_build(self, build, replace):
+        try:
+            while True:
+                with _FileLock(self.build_lock_path, self._build_lock):
+                    if replace or not self.exists():
+                        build()
+                with self._lock:
+                    replace, self._rebuild = self._rebuild, False
+                    if not replace:
+                        self._building = False
+                        return
+        except BaseException:
+            with self._lock:
+                self._building = self._rebuild = False
+            raise
+
+    def add(self, books):
+        """Index new or changed ``(book_id, description, genre, author)`` rows"""
+        with self._exclusive():
+            self._refresh()
+            idf = self._base['idf'] if self._base else array('f', [1.0]) * DIMENSIONS
+            with open(self.delta_path, 'ab') as f:
+                for book_id, description, genre, author in books:
+                    terms, weights = weigh(raw_features(description, genre, author), idf)
+                    f.write(_RECORD.pack(book_id, len(terms)) + terms.tobytes() + weights.tobytes())
+                size = f.tell()
+            if size > COMPACT_BYTES:
+                self._refresh()
+                self._write_base(idf, self._vectors())
+                self._write_file(self.delta_path, b'')
+
+    def clear(self):
+        """Drop the index; build_in_background() makes a new one"""
+        with self._exclusive():
+            for path in (self.base_path, self.delta_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def similar(self, book_ids, limit):
+        """{book_id: [(similar_id, score), ...]} with the ``limit`` nearest books to each of ``book_ids``"""
+        with self._lock:
+            self._refresh()
+            return {book_id: self._nearest(book_id, limit) for book_id in book_ids}
+
+    def _nearest(self, book_id, limit):
+        vector = self._vector(book_id)
+        if vector is None:
+            return []
+        base = self._base
+        scores = defaultdict(float)
+        for term, weight in zip(*vector):
+            if base is not None:
+                start, end = base['post_offsets'][term], base['post_offsets'][term + 1]
+                for doc, posting in zip(base['post_docs'][start:end], base['post_weights'][start:end]):
+                    scores[doc] += weight * posting
+        # Base scores are per document row; books re-added in the delta use their newer vector
+        by_book = {}
+        for doc, score in scores.items():
+            other = base['book_ids'][doc]
+            if other not in self._delta_docs:
+                by_book[other] = score
+        for term, weight in zip(*vector):
+            for other, posting in self._delta_postings.get(term, {}).items():
+                by_book[other] = by_book.get(other, 0.0) + weight * posting
+        by_book.pop(book_id, None)
+        best = heapq.nlargest(limit, by_book.items(), key=lambda item: (item[1], -item[0]))
+        return [(other, score) for other, score in best if score > 0]
+
+    def _vector(self, book_id):
+        if book_id in self._delta_docs:
+            return self._delta_docs[book_id]
+        base = self._base
+        if base is None:
+            return None
+        doc = bisect.bisect_left(base['book_ids'], book_id)
+        if doc == len(base['book_ids']) or base['book_ids'][doc] != book_id:
+            return None
+        start, end = base['doc_offsets'][doc], base['doc_offsets'][doc + 1]
+        return base['doc_terms'][start:end], base['doc_weights'][start:end]
+
+    def _vectors(self):
+        """Every current vector, base and delta merged, as {book_id: (terms, weights)}"""
+        vectors = {}
+        if self._base is not None:
+            for book_id in self._base['book_ids']:
+                terms, weights = self._vector(book_id)
+                vectors[book_id] = (array('i', terms), array('f', weights))
+        vectors.update(self._delta_docs)
+        return vectors
+
+    def _refresh(self):
+        """Remap the snapshot and replay the delta log if another process changed them"""
+        base_id = _file_id(self.base_path)
+        if base_id != self._base_id:
+            self._base_id = base_id
+            self._base = _map_base(self.base_path) if base_id else None
+            self._delta_id = None
+        delta_id = _file_id(self.delta_path)
+        # Compaction swaps in a new, empty log
+        if delta_id is None or self._delta_id is None or delta_id[0] != self._delta_id[0] or delta_id[2] < self._delta_offset:
+            self._delta_offset = 0
+            self._delta_docs = {}
+            self._delta_postings = defaultdict(dict)
+        self._delta_id = delta_id
+        if delta_id is None or delta_id[2] <= self._delta_offset:
+            return
+        with open(self.delta_path, 'rb') as f:
+            f.seek(self._delta_offset)
+            data = f.read()
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            book_id, count = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + 8 * count
+            if end > len(data):
+                break  # a record still being written
+            terms = array('i', data[offset + _RECORD.size:offset + _RECORD.size + 4 * count])
+            weights = array('f', data[offset + _RECORD.size + 4 * count:end])
+            for term in self._delta_docs.get(book_id, ((), ()))[0]:
+                self._delta_postings[term].pop(book_id, None)
+            self._delta_docs[book_id] = (terms, weights)
+            for term, weight in zip(terms, weights):
+                self._delta_postings[term][book_id] = weight
+            offset = end
+        self._delta_offset += offset
+
+    def _delta_since(self, file_id):
+        """The delta log's records appended since it had ``file_id``"""
+        current = _file_id(self.delta_path)
+        if current is None:
+            return b''
+        same_log = file_id is not None and file_id[0] == current[0] and file_id[2] <= current[2]
+        with open(self.delta_path, 'rb') as f:
+            f.seek(file_id[2] if same_log else 0)
+            return f.read()
+
+    def _write_base(self, idf, vectors):
+        book_ids = array('i', sorted(vectors))
+        doc_offsets, doc_terms, doc_weights = array('i', [0]), array('i'), array('f')
+        postings = defaultdict(list)
+        for doc, book_id in enumerate(book_ids):
+            terms, weights = vectors[book_id]
+            doc_terms.extend(terms)
+            doc_weights.extend(weights)
+            doc_offsets.append(len(doc_terms))
+            for term, weight in zip(terms, weights):
+                postings[term].append((doc, weight))
+        post_offsets, post_docs, post_weights = array('i', [0]) * (DIMENSIONS + 1), array('i'), array('f')
+        for term in range(DIMENSIONS):
+            for doc, weight in postings.get(term, ()):
+                post_docs.append(doc)
+                post_weights.append(weight)
+            post_offsets[term + 1] = len(post_docs)
+        header = _HEADER.pack(_MAGIC, DIMENSIONS, len(book_ids), len(doc_terms))
+        sections = (idf, book_ids, doc_offsets, doc_terms, doc_weights, post_offsets, post_docs, post_weights)
+        self._write_file(self.base_path, header + b''.join(section.tobytes() for section in sections))
+
+    def _write_file(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _exclusive(self):
+        return _FileLock(self.lock_path, self._lock)
+
+
+class _FileLock:
+    """Holds a thread lock and, where supported, an exclusive lock on ``path`` across processes"""
+
+    def __init__(self, path, thread_lock):
+        self.path = path
+        self.thread_lock = thread_lock
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        self.file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()  # releases the flock
+        self.thread_lock.release()
+
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _map_base(path):
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, dimensions, docs, terms = _HEADER.unpack_from(mapped)
+    if magic != _MAGIC or dimensions != DIMENSIONS:
+        return None
+    view = memoryview(mapped)
+    base = {}
+    offset = _HEADER.size
+    for name, typecode, length in (
+        ('idf', 'f', dimensions), ('book_ids', 'i', docs), ('doc_offsets', 'i', docs + 1),
+        ('doc_terms', 'i', terms), ('doc_weights', 'f', terms), ('post_offsets', 'i', dimensions + 1),
+        ('post_docs', 'i', terms), ('post_weights', 'f', terms),
+    ):
+        base[name] = view[offset:offset + 4 * length].cast(typecode)
+        offset += 4 * length
+    return base
@@ -0,0 +1,229 @@
+"""Local cache of book cover images, with resized thumbnails.
+
+Covers are fetched from their upstream URL (``book.cover_image``) on first
+request and stored content-addressed. Each image lives in ``blobs/`` under
+the SHA-256 of its bytes, and ``refs/`` maps a (URL, size) pair to that
+hash. The hash doubles as a strong ETag, and covers shared by several books
+are stored once.
+
+The cache directory is held under ``max_bytes``. Every hit refreshes the
+file's mtime, and the least recently used files are evicted first.
+Concurrent misses for the same cover share a single upstream fetch.
+
+The fetcher is pluggable: any ``fetch(url) -> (bytes, content_type)``
+callable. Cover URLs come from users, so the default fetcher only follows
+http and https URLs on allowed hosts, and refuses hosts that resolve to
+private, loopback or otherwise non-public addresses, including after a
+redirect. Resizing needs the optional Pillow package; without it every
+size is served as the original image.
+"""
+import hashlib
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:  # optional dependency
+    Image = None
+
+# Thumbnail widths; 'full' keeps the upstream image
+SIZES = {'small': 120, 'medium': 320, 'full': None}
+MAX_COVER_BYTES = 10 * 1024 * 1024
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+DEFAULT_ALLOWED_HOSTS = ('covers.openlibrary.org',)
+
+
+class CoverFetchError(Exception):
+    """The upstream cover could not be fetched or is not an image"""
+
+
+def check_url(url, allowed_hosts=None):
+    """Raise CoverFetchError unless ``url`` is http(s) on an allowed host with only public addresses.
+
+    ``allowed_hosts`` of None allows any public host.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError as e:
+        raise CoverFetchError(f'invalid cover URL {url}: {e}') from e
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise CoverFetchError(f'{url} is not an http or https URL')
+    host = parts.hostname.lower()
+    if allowed_hosts is not None and host not in allowed_hosts:
+        raise CoverFetchError(f'{host} is not an allowed cover host')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except OSError as e:
+        raise CoverFetchError(f'cannot resolve {host}: {e}') from e
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_global:
+            raise CoverFetchError(f'{host} resolves to the non-public address {address}')
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    """Follows a redirect only to a URL that passes check_url()"""
+
+    def __init__(self, allowed_hosts):
+        self.allowed_hosts = allowed_hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_url(newurl, self.allowed_hosts)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def urllib_fetcher(timeout=10, allowed_hosts=DEFAULT_ALLOWED_HOSTS):
+    """The default fetcher: a checked HTTP GET with a timeout and a size cap"""
+    allowed_hosts = None if allowed_hosts is None else {host.lower() for host in allowed_hosts}
+    opener = urllib.request.build_opener(_CheckedRedirects(allowed_hosts))
+
+    def fetch(url):
+        check_url(url, allowed_hosts)
+        request = urllib.request.Request(url, headers={'User-Agent': 'Bookify cover cache'})
+        try:
+            with opener.open(request, timeout=timeout) as response:
+                body = response.read(MAX_COVER_BYTES + 1)
+                content_type = response.headers.get_content_type()
+        except (OSError, ValueError) as e:
+            raise CoverFetchError(f'fetching {url} failed: {e}') from e
+        if len(body) > MAX_COVER_BYTES:
+            raise CoverFetchError(f'{url} is larger than {MAX_COVER_BYTES} bytes')
+        return body, content_type
+    return fetch
+
+
+class CoverCache:
+    """Content-addressed, size-bounded on-disk cache of cover images"""
+
+    def __init__(self, directory, max_bytes, fetch):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._files = OrderedDict()  # path -> size, least recently used first
+        self._total = 0
+        for sub in ('blobs', 'refs'):
+            os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the LRU order from what is already on disk"""
+        found = []
+        for sub in ('blobs', 'refs'):
+            folder = os.path.join(self.directory, sub)
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._total += size
+
+    def get(self, url, size='full'):
+        """Return ``(path, content_type, etag)`` of the cached cover, fetching it on a miss"""
+        key = hashlib.sha256(f'{size}:{url}'.encode('utf-8')).hexdigest()
+        ref_path = os.path.join(self.directory, 'refs', key)
+        cached = self._read_ref(ref_path)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = self._fill(url, size, ref_path)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _read_ref(self, ref_path):
+        try:
+            with open(ref_path) as f:
+                digest, content_type = f.read().split()
+        except (OSError, ValueError):
+            return None
+        blob_path = os.path.join(self.directory, 'blobs', digest)
+        if not os.path.exists(blob_path):
+            return None
+        self._touch(ref_path)
+        self._touch(blob_path)
+        return blob_path, content_type, digest
+
+    def _fill(self, url, size, ref_path):
+        body, content_type = self.fetch(url)
+        if content_type not in IMAGE_TYPES:
+            raise CoverFetchError(f'{url} returned {content_type}, not an image')
+        if SIZES[size] is not None:
+            body, content_type = resize(body, content_type, SIZES[size])
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = os.path.join(self.directory, 'blobs', digest)
+        if not os.path.exists(blob_path):
+            self._write(blob_path, body)
+        self._write(ref_path, f'{digest} {content_type}'.encode('utf-8'))
+        self._evict(keep=(blob_path, ref_path))
+        return blob_path, content_type, digest
+
+    def _write(self, path, data):
+        # Write then rename, so readers in other threads or workers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._total += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+
+    def _evict(self, keep=()):
+        with self._lock:
+            while self._total > self.max_bytes and len(self._files) > len(keep):
+                path, size = next((item for item in self._files.items() if item[0] not in keep))
+                del self._files[path]
+                self._total -= size
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def resize(body, content_type, width):
+    """Scale an image down to ``width`` pixels wide; returns (body, content_type)"""
+    if Image is None:
+        return body, content_type
+    try:
+        with Image.open(BytesIO(body)) as image:
+            if image.width <= width:
+                return body, content_type
+            height = max(1, round(image.height * width / image.width))
+            thumbnail = image.convert('RGB').resize((width, height), Image.LANCZOS)
+            out = BytesIO()
+            thumbnail.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    except OSError as e:
+        raise CoverFetchError(f'cannot decode cover image: {e}') from e
+    return out.getvalue(), 'image/jpeg'
@@ -0,0 +1,98 @@
+"""Serve the static frontend from the API's own origin.
+
+Scripts and stylesheets referenced by index.html are fingerprinted at
+startup: index.html is served with ``?v=<content hash>`` appended to those
+URLs, so the assets themselves can be cached for a year while index.html is
+revalidated on every load. index.html and those assets are also read into
+memory and gzip / brotli compressed once, at startup.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Blueprint, Response, abort, current_app, request, send_from_directory
+
+from compression import COMPRESSIBLE_TYPES, STATIC_LEVELS, available_encodings, compress, negotiate_encoding, set_encoded_body
+
+FRONTEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+STATIC_EXTENSIONS = {'.html', '.js', '.css', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.ico', '.webp'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_ASSET_REF = re.compile(r'(?P<attr>src|href)="(?P<path>[^":#?]+\.(?:js|css))"')
+
+
+class StaticAsset:
+    """A file held in memory with its ETag and precompressed encodings"""
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.encoded = {}
+        if mimetype in COMPRESSIBLE_TYPES:
+            for encoding in available_encodings():
+                encoded = compress(body, encoding, STATIC_LEVELS[encoding])
+                if len(encoded) < len(body):
+                    self.encoded[encoding] = encoded
+
+    def response(self):
+        response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        encoding = negotiate_encoding() if self.encoded else None
+        if encoding in self.encoded:
+            set_encoded_body(response, self.encoded[encoding], encoding)
+        elif self.mimetype in COMPRESSIBLE_TYPES:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def create_frontend_blueprint(root=FRONTEND_ROOT):
+    """Blueprint serving ``root``'s index.html and static assets"""
+    frontend = Blueprint('frontend', __name__)
+    assets = {}
+    fingerprints = {}
+
+    def fingerprint(path):
+        if path not in fingerprints:
+            with open(os.path.join(root, path), 'rb') as f:
+                assets[path] = StaticAsset(f.read(), mimetypes.guess_type(path)[0])
+            fingerprints[path] = assets[path].etag[:12]
+        return fingerprints[path]
+
+    with open(os.path.join(root, 'index.html'), encoding='utf-8') as f:
+        index_html = _ASSET_REF.sub(
+            lambda m: f'{m["attr"]}="{m["path"]}?v={fingerprint(m["path"])}"'
+            if os.path.isfile(os.path.join(root, m['path'])) else m[0],
+            f.read()
+        ).encode('utf-8')
+    index = StaticAsset(index_html, 'text/html')
+
+    @frontend.route('/')
+    @frontend.route('/index.html')
+    def index_page():
+        response = index.response()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    @frontend.route('/<path:filename>')
+    def static_file(filename):
+        parts = filename.split('/')
+        if (parts[0] == 'backend' or any(part.startswith('.') for part in parts)
+                or os.path.splitext(filename)[1].lower() not in STATIC_EXTENSIONS):
+            abort(404)
+        max_age = current_app.config['STATIC_MAX_AGE']
+        if filename in assets:
+            response = assets[filename].response()
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response = response.make_conditional(request)
+        else:
+            response = send_from_directory(root, filename, max_age=max_age)
+        if request.args.get('v') and request.args['v'] == fingerprints.get(filename):
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+    return frontend
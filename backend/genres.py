@@ -0,0 +1,60 @@
+"""Normalized genre table kept in sync with ``book.genre`` by SQLite triggers.
+
+Each genre name gets one ``genre`` row holding a maintained ``book_count``,
+and every book's ``genre_id`` points at it. Like the search index, the
+triggers cover every write path (ORM, core inserts, seed scripts), so
+filtering is an indexed integer match and unfiltered facet counts are a
+read of a handful of rows.
+"""
+from sqlalchemy import text
+
+_TRIGGERS = {
+    'genre_book_ai': """CREATE TRIGGER IF NOT EXISTS genre_book_ai
+        AFTER INSERT ON book WHEN new.genre IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO genre(name, book_count) VALUES (new.genre, 0);
+        UPDATE genre SET book_count = book_count + 1 WHERE name = new.genre;
+        UPDATE book SET genre_id = (SELECT id FROM genre WHERE name = new.genre) WHERE id = new.id;
+    END""",
+    'genre_book_ad': """CREATE TRIGGER IF NOT EXISTS genre_book_ad
+        AFTER DELETE ON book WHEN old.genre IS NOT NULL BEGIN
+        UPDATE genre SET book_count = book_count - 1 WHERE name = old.genre;
+    END""",
+    'genre_book_au': """CREATE TRIGGER IF NOT EXISTS genre_book_au
+        AFTER UPDATE OF genre ON book WHEN old.genre IS NOT new.genre BEGIN
+        UPDATE genre SET book_count = book_count - 1 WHERE name = old.genre;
+        INSERT OR IGNORE INTO genre(name, book_count) SELECT new.genre, 0 WHERE new.genre IS NOT NULL;
+        UPDATE genre SET book_count = book_count + 1 WHERE name = new.genre;
+        UPDATE book SET genre_id = (SELECT id FROM genre WHERE name = new.genre) WHERE id = new.id;
+    END""",
+}
+
+_BACKFILL = [
+    'INSERT OR IGNORE INTO genre(name, book_count) SELECT DISTINCT genre, 0 FROM book WHERE genre IS NOT NULL',
+    'UPDATE genre SET book_count = (SELECT COUNT(*) FROM book WHERE book.genre = genre.name)',
+    'UPDATE book SET genre_id = (SELECT id FROM genre WHERE genre.name = book.genre)',
+]
+
+
+def install_genre_index(target, connection, **kw):
+    """Create the genre triggers, backfilling genre rows and counts if they are new"""
+    if connection.dialect.name != 'sqlite':
+        return
+    existing = set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'genre_book_%'")
+    ).scalars())
+    for name, statement in _TRIGGERS.items():
+        connection.exec_driver_sql(statement)
+    if existing != set(_TRIGGERS):
+        rebuild_genre_index(connection)
+
+
+def rebuild_genre_index(connection):
+    """Recompute genre rows, counts and book.genre_id from book.genre"""
+    for statement in _BACKFILL:
+        connection.exec_driver_sql(statement)
+
+
+def drop_genre_index(connection):
+    """Drop the genre triggers, e.g. ahead of a large bulk load"""
+    for name in _TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
@@ -0,0 +1,209 @@
+"""Group commit for review and journal writes.
+
+Instead of each request opening its own write transaction, write requests
+hand a job to one writer thread per process. The writer collects the jobs
+that arrive within a short window (``GROUP_COMMIT_WINDOW_MS``, at most
+``GROUP_COMMIT_MAX_BATCH`` jobs) and runs them in one transaction. Each
+request gets its job's result only after that transaction has committed,
+so a 201 still means the write is durable. A burst of N reviews costs one
+commit and one fsync rather than N.
+
+Jobs record what they changed on the WriteBatch they are given, so work
+that only depends on the batch as a whole is done once per commit: one
+aggregate UPDATE per affected book, one bump of the data and shelf
+versions, one refresh of the affected recommendations.
+
+If any job in a batch fails, the batch is rolled back and replayed with
+each job in its own savepoint. Only the failing job's request then sees
+the error.
+
+The statements a job runs on the writer thread are collected with the
+``capture`` hook and handed to the ``replay`` hook on the submitting
+request's thread, so query budgets and per-request metrics still see them.
+A request's budget is charged only its own job's statements. The batch's
+shared ones (the aggregate updates, the commit) grow with the number of
+books in the batch, so they go to metrics alone.
+"""
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+_writer = threading.local()
+
+
+def in_writer():
+    """True on the group-commit writer thread"""
+    return getattr(_writer, 'active', False)
+
+
+class WriteBatch:
+    """Side effects of the jobs in one group commit, applied once per batch"""
+
+    def __init__(self):
+        # book id -> [review count delta, rating sum delta]
+        self.review_deltas = defaultdict(lambda: [0, 0])
+        # kind -> values recorded by jobs with record()
+        self.events = defaultdict(list)
+        self.catalog_changed = False
+        self.shelf_changed = False
+        self._job = None
+
+    def review_delta(self, book_id, count_delta, rating_delta):
+        """Adjust a book's review aggregates when the batch commits"""
+        self._job.append(('review_delta', (book_id, count_delta, rating_delta)))
+
+    def record(self, kind, value):
+        """Note ``value`` under ``events[kind]`` for the batch's before/after-commit hooks"""
+        self._job.append((kind, value))
+
+    def run(self, job):
+        """Run ``job(self)``, keeping what it recorded only if it succeeds"""
+        self._job = []
+        result = job(self)
+        return result, self._job
+
+    def merge(self, recorded):
+        for kind, value in recorded:
+            if kind != 'review_delta':
+                self.events[kind].append(value)
+                continue
+            book_id, count_delta, rating_delta = value
+            totals = self.review_deltas[book_id]
+            totals[0] += count_delta
+            totals[1] += rating_delta
+            self.catalog_changed = True
+            self.shelf_changed = True
+
+
+class GroupCommitter:
+    """Batches write jobs from concurrent requests into shared transactions.
+
+    ``session`` is the scoped session jobs write through. ``before_commit(batch)``
+    applies a batch's collected side effects inside its transaction, and
+    the optional ``after_commit(batch)`` runs once the transaction has committed.
+    ``capture()`` is a context manager yielding the list of statements run
+    inside it, and ``replay(statements, shared)`` charges a job's own and its
+    batch's shared statements to the calling thread.
+    With ``window_ms`` None, jobs run inline in the calling request.
+    """
+
+    def __init__(self, app, session, before_commit, after_commit=None, window_ms=2, max_batch=256,
+                 capture=None, replay=None):
+        self.app = app
+        self.session = session
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self.capture = capture
+        self.replay = replay
+        self.window = None if window_ms is None else window_ms / 1000
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def submit(self, job):
+        """Run ``job(batch)`` in the next group commit and return its result.
+
+        Blocks until the batch has committed; exceptions raised by the job,
+        or by the commit, are re-raised here.
+        """
+        future = Future()
+        if self.window is None:
+            # Inline jobs run on the request's own thread, where they are counted already
+            self._commit([(job, future)], capture=None)
+        else:
+            self._writer_queue().put((job, future))
+        result, error, statements, shared = future.result()
+        if (statements or shared) and self.replay is not None:
+            self.replay(statements, shared)
+        if error is not None:
+            raise error
+        return result
+
+    def _writer_queue(self):
+        # A forked worker process needs its own writer thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name='group-commit', daemon=True).start()
+            return self._queue
+
+    def _run(self, jobs):
+        _writer.active = True
+        while True:
+            batch = [jobs.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(jobs.get(timeout=remaining) if remaining > 0 else jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self._commit(batch, capture=self.capture)
+            except Exception as e:
+                # Keep the writer alive; requests still waiting get the error
+                self.app.logger.exception('Group commit failed')
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result((None, e, [], []))
+
+    def _commit(self, jobs, capture):
+        session = self.session
+        capture = capture or (lambda: nullcontext([]))
+        # Statements run for each job, and for the batch as a whole
+        job_statements = [[] for _ in jobs]
+        shared = []
+        batch = WriteBatch()
+        try:
+            outcomes = []
+            for (job, _), statements in zip(jobs, job_statements):
+                with capture() as captured:
+                    try:
+                        result, recorded = batch.run(job)
+                    finally:
+                        statements.extend(captured)
+                batch.merge(recorded)
+                outcomes.append((result, None))
+            with capture() as captured:
+                try:
+                    self.before_commit(batch)
+                    session.commit()
+                finally:
+                    shared.extend(captured)
+        except Exception:
+            # Replay each job in its own savepoint so one failure doesn't fail the batch
+            session.rollback()
+            batch = WriteBatch()
+            outcomes = []
+            for (job, _), statements in zip(jobs, job_statements):
+                # Charge the replay only, not the failed first attempt
+                statements.clear()
+                with capture() as captured:
+                    try:
+                        with session.begin_nested():
+                            result, recorded = batch.run(job)
+                        batch.merge(recorded)
+                        outcomes.append((result, None))
+                    except Exception as e:
+                        outcomes.append((None, e))
+                    statements.extend(captured)
+            with capture() as captured:
+                try:
+                    self.before_commit(batch)
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    outcomes = [(None, e)] * len(jobs)
+                shared.extend(captured)
+
+        if self.after_commit is not None and any(error is None for _, error in outcomes):
+            self.after_commit(batch)
+        for (_, future), (result, error), statements in zip(jobs, outcomes, job_statements):
+            future.set_result((result, error, statements, shared))
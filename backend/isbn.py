@@ -0,0 +1,59 @@
+"""ISBN validation and normalization.
+
+Books are looked up by ``book.isbn13``: the canonical form of their ISBN,
+13 digits without hyphens, with ISBN-10s converted to their 978-prefixed
+ISBN-13. ``978-0-06-112008-4``, ``0061120081`` and ``9780061120084`` are all
+the same book.
+"""
+import re
+
+from sqlalchemy import text
+
+_SEPARATORS = re.compile(r'[\s-]+')
+_LABEL = re.compile(r'^isbn(?:-1[03])?:?', re.IGNORECASE)
+
+
+def canonical_isbn(value):
+    """The ISBN-13 for ``value`` (an ISBN-10 or ISBN-13 in any common format), or None if it is not a valid ISBN"""
+    if value is None:
+        return None
+    digits = _SEPARATORS.sub('', _LABEL.sub('', str(value).strip())).upper()
+    if len(digits) == 10 and digits[:9].isdigit() and (digits[9].isdigit() or digits[9] == 'X'):
+        check = sum((10 - i) * int(d) for i, d in enumerate(digits[:9])) + (10 if digits[9] == 'X' else int(digits[9]))
+        if check % 11:
+            return None
+        digits = '978' + digits[:9]
+        return digits + _isbn13_check_digit(digits)
+    if len(digits) == 13 and digits.isdigit() and digits[:3] in ('978', '979'):
+        return digits if digits[12] == _isbn13_check_digit(digits[:12]) else None
+    return None
+
+
+def normalize_isbn(value):
+    """Like canonical_isbn(), but raises ValueError for an invalid ISBN"""
+    canonical = canonical_isbn(value)
+    if canonical is None:
+        raise ValueError(f'invalid ISBN: {value}')
+    return canonical
+
+
+def _isbn13_check_digit(first12):
+    return str((10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(first12)) % 10) % 10)
+
+
+def backfill_isbn13(target, connection, **kw):
+    """Canonicalize ``book.isbn`` and fill ``book.isbn13`` for rows written before
+    ISBNs were normalized, or by raw SQL.
+
+    Bulk imports upsert on ``isbn``, so a stored ``0-06-112008-1`` has to
+    become ``9780061120084`` to match a re-import. A row keeps its original
+    ``isbn`` if another book already has the canonical one.
+    """
+    rows = connection.execute(text(
+        'SELECT id, isbn FROM book WHERE isbn IS NOT NULL AND (isbn13 IS NULL OR isbn != isbn13)'
+    )).all()
+    updates = [{'id': book_id, 'isbn13': canonical_isbn(isbn)} for book_id, isbn in rows]
+    updates = [update for update in updates if update['isbn13'] is not None]
+    if updates:
+        connection.execute(text('UPDATE OR IGNORE book SET isbn = :isbn13, isbn13 = :isbn13 WHERE id = :id'), updates)
+        connection.execute(text('UPDATE book SET isbn13 = :isbn13 WHERE id = :id AND isbn13 IS NULL'), updates)
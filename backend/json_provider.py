@@ -0,0 +1,41 @@
+"""Faster JSON encoding for API responses.
+
+Flask's default provider sorts keys and escapes non-ASCII text, both of
+which cost time on large list responses and buy nothing for this API. This
+provider skips both and writes compact separators. If the optional
+``orjson`` package is installed, it is used instead of the stdlib encoder,
+which is several times faster again.
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Compact, unsorted JSON, encoded with orjson when it is available"""
+
+    sort_keys = False
+    ensure_ascii = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            body = self.dumps(obj).encode('utf-8')
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,123 @@
+"""Materialized top-rated and trending leaderboards.
+
+Books are ranked by a Bayesian average rather than their plain mean rating.
+Each book's ratings are blended with ``PRIOR_WEIGHT`` virtual reviews at the
+catalog-wide mean rating::
+
+    (PRIOR_WEIGHT * prior_mean + rating_sum) / (PRIOR_WEIGHT + review_count)
+
+A single 5-star review therefore barely moves a book above the mean, while
+a hundred of them put it near 5.
+
+``book_score`` holds that score for every reviewed book.
+``trending_score`` holds one row per book per window in
+``TRENDING_WINDOWS``: the book's reviews from the last N days, scored as
+``review_count * bayesian_average``, so both volume and rating count.
+Both tables are indexed by score, so a leaderboard is an index range read.
+
+Review writes update the affected rows incrementally in their group
+commit. The prior mean and the trending windows are fixed for a UTC day.
+On the first write or read of a new day, rebuild() recomputes the prior,
+rescores every book and drops reviews that have left each window.
+"""
+from datetime import timedelta
+
+from sqlalchemy import bindparam, text
+
+PRIOR_WEIGHT = 10
+TRENDING_WINDOWS = (7, 30)
+
+_BOOK_SCORE = """INSERT INTO book_score (book_id, genre_id, review_count, score)
+    SELECT id, genre_id, review_count, (:weight * :prior + rating_sum) / (:weight + review_count)
+    FROM book WHERE review_count > 0 {scope}
+    ON CONFLICT (book_id) DO UPDATE SET
+        genre_id = excluded.genre_id, review_count = excluded.review_count, score = excluded.score"""
+
+_TRENDING_SCORE = """INSERT INTO trending_score (days, book_id, review_count, rating_sum, score)
+    SELECT :days, book_id, COUNT(*), SUM(rating),
+           COUNT(*) * (:weight * :prior + SUM(rating)) / (:weight + COUNT(*))
+    FROM review WHERE created_at >= :since GROUP BY book_id"""
+
+_TRENDING_DELTA = """INSERT INTO trending_score (days, book_id, review_count, rating_sum, score)
+    VALUES (:days, :book_id, :count_delta, :rating_delta, 0)
+    ON CONFLICT (days, book_id) DO UPDATE SET
+        review_count = review_count + excluded.review_count, rating_sum = rating_sum + excluded.rating_sum"""
+
+_TRENDING_RESCORE = """UPDATE trending_score
+    SET score = review_count * (:weight * :prior + rating_sum) / (:weight + review_count)
+    WHERE book_id IN :books AND review_count > 0"""
+
+
+def window_start(today, days):
+    """First day counted by a ``days``-day window ending ``today``"""
+    return today - timedelta(days=days - 1)
+
+
+def current_state(connection):
+    """(as_of, prior_mean) of the materialized leaderboards, or None before the first build"""
+    row = connection.execute(text('SELECT as_of, prior_mean FROM leaderboard_state WHERE id = 1')).first()
+    return tuple(row) if row else None
+
+
+def is_current(state, today):
+    return state is not None and str(state[0]) == today.isoformat()
+
+
+def rebuild(connection, today):
+    """Recompute the prior and every leaderboard row as of ``today``"""
+    prior = connection.execute(text(
+        'SELECT COALESCE(CAST(SUM(rating_sum) AS REAL) / NULLIF(SUM(review_count), 0), 3.0) FROM book'
+    )).scalar()
+    params = {'weight': PRIOR_WEIGHT, 'prior': prior}
+    connection.execute(text('DELETE FROM book_score'))
+    connection.execute(text(_BOOK_SCORE.format(scope='')), params)
+    connection.execute(text('DELETE FROM trending_score'))
+    for days in TRENDING_WINDOWS:
+        connection.execute(text(_TRENDING_SCORE), {**params, 'days': days, 'since': window_start(today, days).isoformat()})
+    connection.execute(
+        text('INSERT OR REPLACE INTO leaderboard_state (id, as_of, prior_mean) VALUES (1, :as_of, :prior)'),
+        {'as_of': today.isoformat(), 'prior': prior},
+    )
+
+
+def apply_review_changes(connection, changes, today):
+    """Update the leaderboards for ``(book_id, created_at, count_delta, rating_delta)`` review changes.
+
+    Runs after the book's stored review aggregates have been updated, in
+    the same transaction. On a new day this is a full rebuild instead.
+    """
+    state = current_state(connection)
+    if not is_current(state, today):
+        rebuild(connection, today)
+        return
+    params = {'weight': PRIOR_WEIGHT, 'prior': state[1]}
+    books = sorted({book_id for book_id, _, _, _ in changes})
+    scoped = bindparam('books', expanding=True)
+    connection.execute(
+        text(_BOOK_SCORE.format(scope='AND id IN :books')).bindparams(scoped), {**params, 'books': books}
+    )
+    connection.execute(
+        text('DELETE FROM book_score WHERE book_id IN :books AND '
+             'COALESCE((SELECT review_count FROM book WHERE book.id = book_score.book_id), 0) <= 0').bindparams(scoped),
+        {'books': books},
+    )
+    deltas = [
+        {'days': days, 'book_id': book_id, 'count_delta': count_delta, 'rating_delta': rating_delta}
+        for book_id, created_at, count_delta, rating_delta in changes
+        for days in TRENDING_WINDOWS
+        if created_at.date() >= window_start(today, days)
+    ]
+    if deltas:
+        connection.execute(text(_TRENDING_DELTA), deltas)
+        connection.execute(text(_TRENDING_RESCORE).bindparams(scoped), {**params, 'books': books})
+        connection.execute(
+            text('DELETE FROM trending_score WHERE book_id IN :books AND review_count <= 0').bindparams(scoped),
+            {'books': books},
+        )
+
+
+def sync_genres(connection):
+    """Copy each book's genre_id into book_score, after genres were changed in bulk"""
+    connection.execute(text(
+        'UPDATE book_score SET genre_id = (SELECT genre_id FROM book WHERE book.id = book_score.book_id)'
+    ))
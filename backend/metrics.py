@@ -0,0 +1,196 @@
+"""Request and SQL instrumentation exposed in the Prometheus text format.
+
+Flask request hooks time every request and record its response size, and
+SQLAlchemy cursor events count the statements each request runs and the
+time spent in them. Everything is labelled by route rule (``/api/books/<int:book_id>``
+rather than the concrete URL) so label cardinality stays fixed.
+
+Metrics are kept per process; with several workers each one reports its own
+numbers and the scraper aggregates them.
+
+Statements run on another thread for a request, such as its write on the
+group-commit writer, are collected with capture_statements() and charged
+to the request with ``Metrics.record_statements()``.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Slow-request log entries keep at most this many statements
+SLOW_LOG_STATEMENTS = 50
+
+_captures = threading.local()
+
+
+@contextmanager
+def capture_statements():
+    """Collect ``(seconds, statement)`` for every statement this thread runs inside the block"""
+    stack = _captures.__dict__.setdefault('stack', [])
+    records = []
+    stack.append(records)
+    try:
+        yield records
+    finally:
+        stack.remove(records)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects"""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0, 0])
+
+    def observe(self, labels, value):
+        counts, _, _ = series = self._series[labels]
+        counts[bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(labels, le=bound)} {cumulative}'
+            yield f'{self.name}_sum{_labels(labels)} {total:.6f}'
+            yield f'{self.name}_count{_labels(labels)} {count}'
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = defaultdict(float)
+
+    def inc(self, labels, amount=1):
+        self._series[labels] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._series.items()):
+            yield f'{self.name}{_labels(labels)} {value:g}'
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + [(key, extra[key]) for key in extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Collects request, response-size and SQL metrics for one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('bookify_http_requests_total', 'HTTP requests by route and status')
+        self.latency = Histogram('bookify_http_request_duration_seconds',
+                                 'Time from request start to response', LATENCY_BUCKETS)
+        self.response_size = Histogram('bookify_http_response_size_bytes',
+                                       'Response body size, when known up front', SIZE_BUCKETS)
+        self.statements = Histogram('bookify_sql_statements_per_request',
+                                    'SQL statements executed per request', STATEMENT_BUCKETS)
+        self.sql_time = Histogram('bookify_sql_duration_seconds_per_request',
+                                  'Time spent executing SQL per request', LATENCY_BUCKETS)
+        self.sql_total = Counter('bookify_sql_statements_total',
+                                 'SQL statements executed, including outside requests')
+        # Extra gauges reported at scrape time: name -> (help, callable)
+        self.gauges = {}
+
+    def init_app(self, app):
+        """Install the request hooks on ``app``"""
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def instrument_engine(self, engine):
+        """Count and time every statement run on ``engine``"""
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        # Statements are only kept when the slow-request log is enabled
+        g.sql_log = [] if current_app.config['SLOW_REQUEST_MS'] is not None else None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        with self._lock:
+            self.sql_total.inc(())
+        for records in getattr(_captures, 'stack', ()):
+            records.append((elapsed, statement))
+        if has_request_context() and 'sql_count' in g:
+            self._charge(elapsed, statement)
+
+    def record_statements(self, records):
+        """Charge ``(seconds, statement)`` records run on another thread to the current request"""
+        if has_request_context() and 'sql_count' in g:
+            for elapsed, statement in records:
+                self._charge(elapsed, statement)
+
+    def _charge(self, elapsed, statement):
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        if g.sql_log is not None and len(g.sql_log) < SLOW_LOG_STATEMENTS:
+            g.sql_log.append((elapsed, statement))
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (('method', request.method), ('route', route))
+        with self._lock:
+            self.requests.inc(labels + (('status', response.status_code),))
+            self.latency.observe(labels, elapsed)
+            if response.content_length is not None:
+                self.response_size.observe(labels, response.content_length)
+            self.statements.observe(labels, g.sql_count)
+            self.sql_time.observe(labels, g.sql_seconds)
+
+        threshold = current_app.config['SLOW_REQUEST_MS']
+        if threshold is not None and elapsed * 1000 >= threshold:
+            lines = [f'Slow request: {request.method} {request.full_path.rstrip("?")} -> '
+                     f'{response.status_code} in {elapsed * 1000:.1f} ms, {g.sql_count} statements '
+                     f'({g.sql_seconds * 1000:.1f} ms SQL)']
+            lines += [f'  {seconds * 1000:8.2f} ms  {" ".join(statement.split())}'
+                      for seconds, statement in g.sql_log]
+            current_app.logger.warning('\n'.join(lines))
+        return response
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.response_size,
+                           self.statements, self.sql_time, self.sql_total):
+                lines.extend(metric.render())
+        for name, (help, read) in sorted(self.gauges.items()):
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {read():g}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,134 @@
+"""Per-route SQL statement budgets to catch N+1 query patterns.
+
+Views declare how many statements a request may run::
+
+    @api.route('/api/books/<int:book_id>')
+    @query_budget(3)
+    def get_book(book_id): ...
+
+Statements are counted with SQLAlchemy cursor events on the current thread.
+Statements run for the request on another thread, such as its write on the
+group-commit writer, are charged to it with record_statements().
+A request breaks its budget if it runs more statements than declared, or if
+it runs the same statement shape (the SQL text with IN lists collapsed) more
+than ``max_repeats`` times. That second check is the usual sign of a lazy
+load inside a loop, and it catches one even when the total is still small.
+
+What happens then depends on ``app.config['QUERY_BUDGET']``. ``'raise'``
+raises QueryBudgetExceeded, which fails the test that made the request.
+``'log'`` logs an error that lists the statements. ``'off'`` skips counting
+entirely. Left as None, it means ``'raise'`` under TESTING, ``'log'`` in
+debug mode and ``'off'`` otherwise.
+
+The same check works directly in tests::
+
+    with QueryBudget(2):
+        client.get('/api/journal')
+"""
+import re
+import threading
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+
+DEFAULT_MAX_REPEATS = 3
+
+_active = threading.local()
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block of code ran more SQL than its declared budget"""
+
+
+def install_query_budget(engine):
+    """Report statements run on ``engine`` to the active budgets"""
+    event.listen(engine, 'before_cursor_execute', _record)
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    record_statements((statement,))
+
+
+def record_statements(statements):
+    """Charge ``statements`` to the budgets active on this thread"""
+    budgets = getattr(_active, 'budgets', None)
+    if not budgets:
+        return
+    for statement in statements:
+        if statement.startswith('BEGIN'):
+            continue
+        shape = _IN_LIST.sub('(?)', _WHITESPACE.sub(' ', statement.strip()))
+        for budget in budgets:
+            budget.statements.append(shape)
+
+
+class QueryBudget:
+    """Context manager counting the statements run inside it on this thread"""
+
+    def __init__(self, max_statements, max_repeats=DEFAULT_MAX_REPEATS, label=None, on_violation='raise'):
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        self.label = label or 'block'
+        self.on_violation = on_violation
+        self.statements = []
+
+    def __enter__(self):
+        if not hasattr(_active, 'budgets'):
+            _active.budgets = []
+        _active.budgets.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.budgets.remove(self)
+        if exc_type is None:
+            self.check()
+        return False
+
+    def violations(self):
+        """Human-readable reasons this budget was broken, if any"""
+        problems = []
+        if len(self.statements) > self.max_statements:
+            problems.append(f'ran {len(self.statements)} statements, budget is {self.max_statements}')
+        for shape, count in Counter(self.statements).most_common():
+            if count <= self.max_repeats:
+                break
+            problems.append(f'ran the same statement {count} times (possible N+1): {shape}')
+        return problems
+
+    def check(self):
+        problems = self.violations()
+        if not problems:
+            return
+        listing = '\n'.join(f'  {i + 1}. {statement}' for i, statement in enumerate(self.statements))
+        message = f'Query budget exceeded in {self.label}: ' + '; '.join(problems) + '\n' + listing
+        if self.on_violation == 'raise':
+            raise QueryBudgetExceeded(message)
+        current_app.logger.error(message)
+
+
+def budget_mode():
+    """The effective QUERY_BUDGET setting for the current app"""
+    mode = current_app.config.get('QUERY_BUDGET')
+    if mode is None:
+        mode = 'raise' if current_app.testing else 'log' if current_app.debug else 'off'
+    return mode
+
+
+def query_budget(max_statements, max_repeats=DEFAULT_MAX_REPEATS):
+    """Declare a view's statement budget (see the module docstring)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = budget_mode()
+            if mode == 'off':
+                return view(*args, **kwargs)
+            label = f'{request.method} {request.path}'
+            with QueryBudget(max_statements, max_repeats, label=label, on_violation=mode):
+                return view(*args, **kwargs)
+        wrapper.query_budget = max_statements
+        return wrapper
+    return decorator
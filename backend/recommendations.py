@@ -0,0 +1,238 @@
+"""Item-to-item "readers who liked this also liked" recommendations.
+
+A reader likes a book when they review it with at least ``LIKE_THRESHOLD``
+stars. Two books are similar when the same readers like both. The score is
+a shrunk Jaccard index over their sets of likers::
+
+    co_likes / (likers_a + likers_b - co_likes + SHRINK)
+
+``SHRINK`` keeps a pair that shares one or two readers from outranking a
+pair that shares many readers. Readers who like more than
+``MAX_READER_LIKES`` books still count toward each book's likers. They add
+no pairs, though, because they connect everything to everything, and their
+pairs would dominate the cost of a rebuild.
+
+Only the ``TOP_K`` best neighbours of each book are kept, in the
+``book_similarity`` table, so serving them is one primary-key range read.
+The whole computation runs in the database as a single SELECT.
+A full rebuild scores every book. After review writes commit,
+SimilarRefresher rescores only the books they touched, on a background
+thread. Rescoring a popular book reads the likes of all its readers, which
+can take seconds, so it runs outside any write transaction. Only the
+swap of the new rows goes through the writer.
+
+A new or removed like also changes the liker count of its book, which is
+in the score of every pair with that book. A popular book is listed by
+thousands of others, too many to rescore in full. Instead, the stored
+scores of the pairs listing it are recomputed in place. That keeps those
+lists correctly ordered, but a book just outside a list's top K does not
+move into it until the next ``flask rebuild-similar``.
+"""
+import os
+import queue
+import threading
+
+from sqlalchemy import bindparam, text
+
+LIKE_THRESHOLD = 4
+TOP_K = 20
+MAX_READER_LIKES = 200
+SHRINK = 5
+# Books rescored per write by SimilarRefresher
+REFRESH_CHUNK = 50
+
+# Readers whose likes produce pairs: everyone, or only those who like one of :books
+_ALL_READERS = """readers AS (
+        SELECT reviewer_name AS reader FROM review WHERE rating >= :threshold
+        GROUP BY reviewer_name HAVING COUNT(DISTINCT book_id) BETWEEN 2 AND :max_likes
+    )"""
+_SCOPED_READERS = """readers AS (
+        SELECT reviewer_name AS reader FROM review
+        WHERE rating >= :threshold AND reviewer_name IN (
+            SELECT reviewer_name FROM review WHERE rating >= :threshold AND book_id IN :books
+        )
+        GROUP BY reviewer_name HAVING COUNT(DISTINCT book_id) BETWEEN 2 AND :max_likes
+    )"""
+
+_SCORE = """WITH {readers},
+    liked AS (
+        SELECT DISTINCT reviewer_name AS reader, book_id FROM review
+        WHERE rating >= :threshold AND reviewer_name IN (SELECT reader FROM readers)
+    ),
+    pairs AS (
+        SELECT a.book_id AS book_id, b.book_id AS similar_id, COUNT(*) AS co_likes
+        FROM liked a JOIN liked b ON b.reader = a.reader AND b.book_id != a.book_id
+        {scope}
+        GROUP BY a.book_id, b.book_id
+    ),
+    likers AS (
+        SELECT book_id, COUNT(DISTINCT reviewer_name) AS n FROM review
+        WHERE rating >= :threshold AND book_id IN (SELECT similar_id FROM pairs UNION SELECT book_id FROM pairs)
+        GROUP BY book_id
+    ),
+    ranked AS (
+        SELECT pairs.book_id, pairs.similar_id, pairs.co_likes,
+               CAST(pairs.co_likes AS REAL) / (a.n + b.n - pairs.co_likes + :shrink) AS score
+        FROM pairs
+        JOIN likers a ON a.book_id = pairs.book_id
+        JOIN likers b ON b.book_id = pairs.similar_id
+    ),
+    top AS (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY book_id ORDER BY score DESC, similar_id) AS position
+        FROM ranked
+    )
+    SELECT book_id, similar_id, score, co_likes FROM top WHERE position <= :top_k"""
+
+_PARAMS = {'threshold': LIKE_THRESHOLD, 'max_likes': MAX_READER_LIKES, 'shrink': SHRINK, 'top_k': TOP_K}
+
+
+def rebuild_similar(connection):
+    """Recompute every book's neighbours from the review table"""
+    connection.execute(text('DELETE FROM book_similarity'))
+    statement = 'INSERT INTO book_similarity (book_id, similar_id, score, co_likes) ' + _SCORE.format(
+        readers=_ALL_READERS, scope='')
+    return connection.execute(text(statement), _PARAMS).rowcount
+
+
+def score_similar(connection, book_ids):
+    """``(book_id, similar_id, score, co_likes)`` rows of the current neighbours of ``book_ids``"""
+    statement = _SCORE.format(readers=_SCOPED_READERS, scope='WHERE a.book_id IN :books')
+    return [tuple(row) for row in connection.execute(
+        text(statement).bindparams(bindparam('books', expanding=True)), {**_PARAMS, 'books': sorted(book_ids)}
+    )]
+
+
+def score_listings(connection, book_ids):
+    """``(book_id, similar_id, score)`` of the stored pairs listing ``book_ids``, rescored with current liker counts"""
+    statement = """WITH listed AS (
+            SELECT book_id, similar_id, co_likes FROM book_similarity WHERE similar_id IN :books
+        ),
+        likers AS (
+            SELECT book_id, COUNT(DISTINCT reviewer_name) AS n FROM review
+            WHERE rating >= :threshold AND book_id IN (SELECT book_id FROM listed UNION SELECT similar_id FROM listed)
+            GROUP BY book_id
+        )
+        SELECT listed.book_id, listed.similar_id,
+               CAST(listed.co_likes AS REAL) / (a.n + COALESCE(b.n, 0) - listed.co_likes + :shrink)
+        FROM listed
+        JOIN likers a ON a.book_id = listed.book_id
+        LEFT JOIN likers b ON b.book_id = listed.similar_id"""
+    return [tuple(row) for row in connection.execute(
+        text(statement).bindparams(bindparam('books', expanding=True)), {**_PARAMS, 'books': sorted(book_ids)}
+    )]
+
+
+def store_similar(connection, book_ids, rows, scores=()):
+    """Replace the stored neighbours of ``book_ids`` with ``rows`` from score_similar(),
+    then apply ``scores`` from score_listings()"""
+    if book_ids:
+        connection.execute(
+            text('DELETE FROM book_similarity WHERE book_id IN :books').bindparams(bindparam('books', expanding=True)),
+            {'books': sorted(book_ids)},
+        )
+    if rows:
+        connection.execute(
+            text('INSERT INTO book_similarity (book_id, similar_id, score, co_likes) '
+                 'VALUES (:book_id, :similar_id, :score, :co_likes)'),
+            [dict(zip(('book_id', 'similar_id', 'score', 'co_likes'), row)) for row in rows],
+        )
+    if scores:
+        connection.execute(
+            text('UPDATE book_similarity SET score = :score WHERE book_id = :book_id AND similar_id = :similar_id'),
+            [dict(zip(('book_id', 'similar_id', 'score'), row)) for row in scores],
+        )
+
+
+def affected_books(connection, changes):
+    """Books whose neighbours change when the ``(reader, book_id)`` likes in ``changes`` are added or removed.
+
+    That is each changed book, plus every other book its reader likes
+    (their pair counts with the changed book moved). Readers over
+    ``MAX_READER_LIKES`` add no pairs, so only their changed books count.
+    """
+    books = {book_id for _, book_id in changes}
+    readers = sorted({reader for reader, _ in changes})
+    if not readers:
+        return books
+    rows = connection.execute(
+        text('SELECT DISTINCT reviewer_name, book_id FROM review WHERE rating >= :threshold AND reviewer_name IN :readers')
+        .bindparams(bindparam('readers', expanding=True)),
+        {'threshold': LIKE_THRESHOLD, 'readers': readers},
+    )
+    liked = {}
+    for reader, book_id in rows:
+        liked.setdefault(reader, set()).add(book_id)
+    for reader_books in liked.values():
+        if len(reader_books) <= MAX_READER_LIKES:
+            books |= reader_books
+    return books
+
+
+class SimilarRefresher:
+    """Rescores the neighbours of books whose likes changed, on a background thread.
+
+    add() takes the ``(reader, book_id)`` like changes of a committed write.
+    The thread finds the affected books and scores them through ``session``
+    with plain reads, then calls ``store(book_ids, rows)`` for every
+    ``REFRESH_CHUNK`` books to write the new rows. Last it rescores the
+    stored pairs listing the changed books and calls ``store((), [], scores)``.
+    Changes that arrive during a refresh are merged into the next one.
+    """
+
+    def __init__(self, app, session, store):
+        self.app = app
+        self.session = session
+        self.store = store
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def add(self, changes):
+        """Queue like changes for rescoring"""
+        self._changes().put(list(changes))
+
+    def wait(self):
+        """Block until every queued change has been rescored"""
+        self._changes().join()
+
+    def refresh(self, changes):
+        """Rescore the books affected by ``changes`` now; needs an app context"""
+        books = sorted(affected_books(self.session.connection(), changes))
+        self.session.rollback()
+        for start in range(0, len(books), REFRESH_CHUNK):
+            chunk = books[start:start + REFRESH_CHUNK]
+            rows = score_similar(self.session.connection(), chunk)
+            # End the read transaction before writing
+            self.session.rollback()
+            self.store(chunk, rows)
+        # The changed books' liker counts moved, and with them every pair listing them
+        scores = score_listings(self.session.connection(), {book_id for _, book_id in changes})
+        self.session.rollback()
+        if scores:
+            self.store((), [], scores)
+
+    def _changes(self):
+        # A forked worker process needs its own thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name='similar-refresh', daemon=True).start()
+            return self._queue
+
+    def _run(self, changes):
+        while True:
+            items = [changes.get()]
+            while True:
+                try:
+                    items.append(changes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self.refresh([change for item in items for change in item])
+            except Exception:
+                self.app.logger.exception('Rescoring similar books failed')
+            finally:
+                for _ in items:
+                    changes.task_done()
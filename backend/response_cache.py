@@ -0,0 +1,97 @@
+"""In-process LRU cache for GET responses with ETag / Last-Modified validation.
+
+Entries are keyed by the data version they were rendered at, so bumping the
+version (see ``bump_data_version`` in app.py) makes every older entry
+unreachable without having to track which responses a write touched.
+Each entry also keeps the gzip / brotli encodings of its body once a client
+has asked for them, so cache hits are never recompressed.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from compression import CACHED_LEVELS, compress, is_compressible, negotiate_encoding, set_encoded_body
+
+
+class ResponseCache:
+    """A thread-safe, size-bounded LRU of rendered response bodies"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cached(self, current_version):
+        """Decorate a GET view so its 200 responses are cached and revalidated.
+
+        ``current_version`` returns ``(version, last_modified)`` for the data
+        the view reads. Responses carry a content-hash ETag and the
+        Last-Modified time, and conditional requests get a 304.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                version, last_modified = current_version()
+                key = (id(current_app._get_current_object()), version, request.path,
+                       tuple(sorted(request.args.items(multi=True))))
+                entry = self.get(key)
+                if entry is None:
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+                        'encoded': {},
+                    }
+                    self.put(key, entry)
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+                if is_compressible(entry['mimetype'], len(entry['body'])):
+                    encoding = negotiate_encoding()
+                    if encoding is not None:
+                        encoded = entry['encoded'].get(encoding)
+                        if encoded is None:
+                            encoded = compress(entry['body'], encoding, CACHED_LEVELS[encoding])
+                            entry['encoded'][encoding] = encoded
+                        set_encoded_body(response, encoded, encoding)
+                    else:
+                        response.vary.add('Accept-Encoding')
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                # Let browsers and proxies keep the body but revalidate each time
+                response.cache_control.no_cache = True
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
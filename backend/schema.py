@@ -0,0 +1,28 @@
+"""Lightweight in-place schema upgrades for existing SQLite databases.
+
+``db.create_all()`` only creates missing tables. This fills the gap for
+tables that already exist by adding any new model columns and indexes, so
+an old ``bookify.db`` keeps working after a column is introduced.
+"""
+from sqlalchemy import inspect
+
+
+def add_missing_columns(target, connection, **kw):
+    """Add columns and indexes that the models define but the database lacks"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in target.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f' DEFAULT {getattr(default, "text", default)}'
+            connection.exec_driver_sql(ddl)
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
@@ -0,0 +1,89 @@
+"""SQLite FTS5 full-text index over the book catalog.
+
+The index is an external-content FTS5 table backed by the ``book`` table and
+kept in sync by triggers, so every write path (ORM, core inserts, seed
+scripts) updates it in the same transaction as the row itself.
+"""
+import re
+
+from sqlalchemy import Float, Integer, text
+
+FTS_TABLE = 'book_fts'
+
+# Column weights for bm25(): title matches rank above author, author above
+# isbn/description.
+RANK_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, isbn, description,
+        content='book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn, description)
+        VALUES (new.id, new.title, new.author, new.isbn, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn, description)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF title, author, isbn, description ON book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, isbn, description)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, isbn, description)
+        VALUES (new.id, new.title, new.author, new.isbn, new.description);
+    END""",
+]
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def install_search_index(target, connection, **kw):
+    """Create the FTS table and triggers, rebuilding the index if it is new"""
+    if connection.dialect.name != 'sqlite':
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    """Repopulate the index from the book table"""
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(search):
+    """Turn free-text user input into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so input can never inject FTS
+    syntax and ``gats`` matches ``Gatsby``. Returns None when the input has
+    no searchable words.
+    """
+    terms = _TOKEN_RE.findall(search)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_subquery(match):
+    """Matching book ids with their bm25 rank (lower is more relevant)"""
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    return text(
+        f'SELECT rowid AS book_id, bm25({FTS_TABLE}, {weights}) AS rank '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match'
+    ).bindparams(match=match).columns(book_id=Integer, rank=Float).subquery()
+
+
+def drop_search_index(connection):
+    """Drop the FTS table and its triggers, e.g. ahead of a large bulk load"""
+    for suffix in ('_ai', '_ad', '_au'):
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {FTS_TABLE}{suffix}')
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {FTS_TABLE}')
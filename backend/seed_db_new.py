@@ -1,6 +1,9 @@
-from app import app, db, Book
+from app import create_app, db, Book, bump_data_version, rebuild_derived_data
+from isbn import canonical_isbn
 import os
 
+app = create_app()
+
 def seed_books():
     """Seed the database with 30+ books with valid cover images"""
     books_data = [
@@ -308,10 +311,13 @@ def seed_books():
         Book.query.delete()
         db.session.commit()
         
-        for book_data in books_data:
-            book = Book(**book_data)
-            db.session.add(book)
-        
+        # One executemany insert instead of an ORM add per book; core inserts
+        # skip Book's @validates hook, so isbn13 is set here
+        for book in books_data:
+            book['isbn13'] = canonical_isbn(book['isbn'])
+        db.session.execute(db.insert(Book), books_data)
+        bump_data_version()
+        rebuild_derived_data()
         db.session.commit()
         print(f'Successfully seeded {len(books_data)} books!')
 
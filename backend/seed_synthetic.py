@@ -0,0 +1,232 @@
+"""Generate a large, deterministic synthetic catalog for performance work.
+
+Unlike seed_db.py's fixed book list, this creates any number of books,
+reviews and journal entries from a random seed, with production-like skew:
+review counts per book follow a Zipf distribution and genres follow a
+weighted mix. Rows are written with batched executemany inserts, so millions
+of rows load in minutes.
+
+    python seed_synthetic.py --books 100000 --reviews 1000000 --journal 5000 --seed 42
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from app import bump_data_version, create_app, db, rebuild_derived_data
+from genres import drop_genre_index, install_genre_index
+from search import drop_search_index, install_search_index
+
+# The format SQLAlchemy's SQLite DateTime type stores and parses
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+GENRES = {
+    'Literary Fiction': 18, 'Fantasy': 14, 'Mystery': 12, 'Romance': 12,
+    'Science Fiction': 10, 'Thriller': 8, 'Historical Fiction': 7, 'Non-Fiction': 6,
+    'Young Adult': 5, 'Horror': 3, 'Dystopian': 2, 'Poetry': 1, 'Gothic Fiction': 1, 'Adventure': 1,
+}
+STATUSES = {'want-to-read': 5, 'reading': 2, 'completed': 3}
+
+TITLE_ADJECTIVES = [
+    'Silent', 'Crimson', 'Hidden', 'Last', 'Broken', 'Golden', 'Distant', 'Secret', 'Winter',
+    'Burning', 'Lost', 'Wandering', 'Forgotten', 'Quiet', 'Endless', 'Midnight', 'Paper', 'Glass',
+]
+TITLE_NOUNS = [
+    'River', 'Garden', 'Kingdom', 'Letters', 'House', 'Orchard', 'Harbor', 'Empire', 'Library',
+    'Mountain', 'Mirror', 'Station', 'Lighthouse', 'Archive', 'Forest', 'Summer', 'City', 'Sea',
+]
+TITLE_PATTERNS = [
+    'The {adj} {noun}', '{adj} {noun}', 'The {noun} of {adj} Things', 'A {noun} in {place}',
+    'Beyond the {adj} {noun}', 'The Last {noun}', '{noun} and {noun2}',
+]
+PLACES = ['Autumn', 'Venice', 'the North', 'Exile', 'Paris', 'Ruins', 'Bloom', 'Kyoto', 'the Dark']
+FIRST_NAMES = [
+    'Ada', 'Bruno', 'Clara', 'Dmitri', 'Elena', 'Farah', 'Gabriel', 'Hana', 'Ivan', 'Jonas',
+    'Keiko', 'Liam', 'Maya', 'Nikolai', 'Olga', 'Pablo', 'Quinn', 'Rosa', 'Sami', 'Tomas',
+]
+LAST_NAMES = [
+    'Abernathy', 'Byrne', 'Castellano', 'Dorsey', 'Eklund', 'Fontaine', 'Garza', 'Hollis',
+    'Ivanova', 'Jensen', 'Kowalski', 'Lindqvist', 'Moreau', 'Nakamura', 'Okafor', 'Petrov',
+    'Quinlan', 'Rossi', 'Sato', 'Tanaka', 'Underwood', 'Vasquez', 'Whitaker', 'Yilmaz',
+]
+DESCRIPTION_WORDS = [
+    'a', 'story', 'of', 'love', 'loss', 'memory', 'family', 'war', 'journey', 'secrets', 'and',
+    'the', 'city', 'young', 'woman', 'man', 'discovers', 'past', 'truth', 'across', 'generations',
+    'haunting', 'tale', 'friendship', 'betrayal', 'small', 'town', 'world', 'changed', 'forever',
+]
+COMMENTS = [
+    'Could not put it down.', 'Beautifully written.', 'Slow start, great ending.',
+    'Not for me.', 'A new favourite.', 'Overrated.', 'The characters stayed with me.', None,
+]
+
+
+def isbn13(number):
+    """A valid ISBN-13 in the 979 range, unique for each ``number``"""
+    digits = f'979{number:09d}'
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative weights for picking ranks 1..n with probability ~ 1 / rank**exponent"""
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cum.append(total)
+    return cum
+
+
+def weighted(rng, table, k):
+    """Draw ``k`` keys of ``table`` with probability proportional to their values"""
+    return rng.choices(list(table), weights=list(table.values()), k=k)
+
+
+def generate_book(rng, number, genre):
+    """One book row, minus its id, in INSERT column order"""
+    pattern = rng.choice(TITLE_PATTERNS)
+    title = pattern.format(
+        adj=rng.choice(TITLE_ADJECTIVES), noun=rng.choice(TITLE_NOUNS),
+        noun2=rng.choice(TITLE_NOUNS), place=rng.choice(PLACES),
+    )
+    author = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    words = rng.choices(DESCRIPTION_WORDS, k=rng.randint(12, 40))
+    description = ' '.join(words).capitalize() + '.'
+    return (title, author, isbn13(number), description, None, genre, rng.randint(1800, 2024), 0.0, 0, 0)
+
+
+def seed_synthetic(books, reviews, journal, seed=0, zipf_exponent=1.1, reviewers=None,
+                   end_date=None, batch_size=10000, log=print, app=None):
+    """Replace the catalog of ``app`` (default: a new create_app()) with generated data.
+
+    Returns the row counts written.
+    """
+    app = app or create_app()
+    options = {
+        'rng': random.Random(seed),
+        'end': datetime.combine(end_date or date.today(), dt_time()),
+        'zipf_exponent': zipf_exponent,
+        'reviewers': reviewers or max(1, reviews // 20),
+        'batch_size': batch_size,
+        'started': time.perf_counter(),
+        'log': log,
+    }
+    journal = min(journal, books)
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.connect() as conn:
+            # sqlite3 refuses to change synchronous inside a transaction, so
+            # set it on the driver connection before beginning one
+            raw = conn.connection.driver_connection
+            previous = raw.execute('PRAGMA synchronous').fetchone()[0]
+            raw.execute('PRAGMA synchronous = OFF')
+            try:
+                with conn.begin():
+                    _write_rows(conn, books, reviews, journal, **options)
+            finally:
+                raw.execute(f'PRAGMA synchronous = {previous}')
+        log(f'  search and genre indexes built ({time.perf_counter() - options["started"]:.1f}s)')
+        bump_data_version()
+        rebuild_derived_data()
+        db.session.commit()
+        log(f'  leaderboards and content index rebuilt ({time.perf_counter() - options["started"]:.1f}s); '
+            f'run `flask rebuild-similar` for "also liked" neighbours')
+
+    return {'books': books, 'reviews': reviews, 'journal': journal}
+
+
+def _write_rows(conn, books, reviews, journal, rng, end, zipf_exponent, reviewers, batch_size, started, log):
+    span_seconds = int(timedelta(days=730).total_seconds())
+    for table in ('journal_entry', 'review', 'book'):
+        conn.exec_driver_sql(f'DELETE FROM {table}')
+    # Index the whole table once at the end instead of per row
+    drop_search_index(conn)
+    drop_genre_index(conn)
+
+    genres = weighted(rng, GENRES, books)
+    for start in range(0, books, batch_size):
+        rows = [
+            (number,) + generate_book(rng, number, genres[number - 1])
+            for number in range(start + 1, min(start + batch_size, books) + 1)
+        ]
+        conn.exec_driver_sql(
+            'INSERT INTO book (id, title, author, isbn, description, cover_image, genre, '
+            'publication_year, rating, review_count, rating_sum) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+        )
+    # Generated ISBNs are already canonical ISBN-13s
+    conn.exec_driver_sql('UPDATE book SET isbn13 = isbn WHERE isbn13 IS NULL')
+    log(f'  {books} books ({time.perf_counter() - started:.1f}s)')
+
+    # Popular books are scattered through the id range rather than being the
+    # lowest ids
+    popularity = list(range(1, books + 1))
+    rng.shuffle(popularity)
+    book_cum = zipf_cum_weights(books, zipf_exponent)
+    reviewer_cum = zipf_cum_weights(reviewers, 0.8)
+    quality = [rng.uniform(2.0, 4.8) for _ in range(books)]
+    counts = [0] * books
+    sums = [0] * books
+    for start in range(0, reviews, batch_size):
+        size = min(batch_size, reviews - start)
+        ranks = rng.choices(range(books), cum_weights=book_cum, k=size)
+        readers = rng.choices(range(reviewers), cum_weights=reviewer_cum, k=size)
+        rows = []
+        for rank, reader in zip(ranks, readers):
+            index = popularity[rank] - 1
+            rating = min(5, max(1, round(rng.gauss(quality[index], 0.9))))
+            counts[index] += 1
+            sums[index] += rating
+            created = end - timedelta(seconds=rng.randrange(span_seconds))
+            rows.append((index + 1, f'reader{reader:06d}', rating, rng.choice(COMMENTS),
+                         created.strftime(TIMESTAMP_FORMAT)))
+        conn.exec_driver_sql(
+            'INSERT INTO review (book_id, reviewer_name, rating, comment, created_at) '
+            'VALUES (?, ?, ?, ?, ?)', rows
+        )
+    aggregates = [(counts[i], sums[i], sums[i] / counts[i], i + 1) for i in range(books) if counts[i]]
+    if aggregates:
+        conn.exec_driver_sql(
+            'UPDATE book SET review_count = ?, rating_sum = ?, rating = ? WHERE id = ?', aggregates
+        )
+    log(f'  {reviews} reviews by {reviewers} reviewers ({time.perf_counter() - started:.1f}s)')
+
+    shelved = rng.sample(range(1, books + 1), journal)
+    statuses = weighted(rng, STATUSES, journal)
+    rows = []
+    for book_id, status in zip(shelved, statuses):
+        created = (end - timedelta(seconds=rng.randrange(span_seconds))).strftime(TIMESTAMP_FORMAT)
+        rating = rng.randint(1, 5) if status == 'completed' else None
+        rows.append((book_id, None, status, rating, created, created))
+    if rows:
+        conn.exec_driver_sql(
+            'INSERT INTO journal_entry (book_id, user_notes, status, rating, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows
+        )
+    log(f'  {journal} journal entries ({time.perf_counter() - started:.1f}s)')
+
+    install_search_index(db.metadata, conn)
+    install_genre_index(db.metadata, conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic data at scale')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--journal', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--zipf', type=float, default=1.1, help='skew of reviews per book')
+    parser.add_argument('--reviewers', type=int, help='distinct reviewer names (default reviews / 20)')
+    parser.add_argument('--end-date', type=date.fromisoformat,
+                        help='newest review date, YYYY-MM-DD (default today); fix it for identical reruns')
+    args = parser.parse_args()
+
+    print(f'Seeding synthetic data (seed={args.seed})...')
+    seed_synthetic(args.books, args.reviews, args.journal, seed=args.seed, zipf_exponent=args.zipf,
+                   reviewers=args.reviewers, end_date=args.end_date)
+    print('Successfully seeded synthetic data!')
+
+
+if __name__ == '__main__':
+    main()
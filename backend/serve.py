@@ -0,0 +1,168 @@
+"""Pre-fork production launcher for Bookify.
+
+The master process builds the app once, creates the tables, binds the
+listening socket and forks worker processes that each run a threaded WSGI
+server on that shared socket. The frontend is served from the same origin,
+so the whole application is available on one port.
+
+    python serve.py                        # one worker per CPU on port 5001
+    python serve.py --workers 4 --port 8080
+
+Signals sent to the master:
+
+    SIGHUP           graceful restart: start new workers, then let the old
+                     ones finish their in-flight requests and exit. New
+                     workers are forked from the master's already loaded
+                     app, so deploying new code needs a full restart
+    SIGTERM, SIGINT  graceful shutdown
+
+Workers that exit unexpectedly are replaced. On platforms without
+``os.fork`` (Windows) a single threaded server is run instead.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+from app import build_content_index, create_app, db
+
+SHUTDOWN_TIMEOUT = 30
+
+
+def run_worker(app, sock):
+    """Serve requests on the inherited ``sock`` until SIGTERM"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    # Non-daemon request threads are joined by server_close(), so a
+    # stopping worker finishes the requests it has already accepted
+    server.daemon_threads = False
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+    server.server_close()
+
+
+class Master:
+    """Fork, supervise and restart worker processes"""
+
+    def __init__(self, app, sock, workers):
+        self.app = app
+        self.sock = sock
+        self.size = workers
+        self.workers = set()
+        self.pending = []
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.app, self.sock)
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            os._exit(status)
+        self.workers.add(pid)
+        return pid
+
+    def stop(self, pids, timeout=SHUTDOWN_TIMEOUT):
+        """SIGTERM ``pids``, waiting up to ``timeout`` seconds before SIGKILL"""
+        for pid in pids:
+            self.signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            remaining -= self.reap()
+            time.sleep(0.05)
+        for pid in remaining:
+            self.signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.discard(pid)
+
+    def signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """Collect exited workers and return their pids"""
+        exited = set()
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.workers.discard(pid)
+            exited.add(pid)
+        return exited
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.pending.append(signum))
+        for _ in range(self.size):
+            self.spawn()
+        print(f'Bookify master {os.getpid()}: {self.size} workers', flush=True)
+
+        while True:
+            while self.pending:
+                signum = self.pending.pop(0)
+                if signum == signal.SIGHUP:
+                    old = set(self.workers)
+                    for _ in range(self.size):
+                        self.spawn()
+                    self.stop(old)
+                    print(f'Bookify master {os.getpid()}: workers restarted', flush=True)
+                else:
+                    self.stop(set(self.workers))
+                    return
+            for pid in self.reap():
+                print(f'Bookify master {os.getpid()}: worker {pid} exited, replacing it', flush=True)
+                self.spawn()
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Bookify with several worker processes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--mode', choices=['production', 'development'], default='production',
+                        help='database mode (default production)')
+    args = parser.parse_args()
+
+    app = create_app({'DATABASE_MODE': args.mode})
+    with app.app_context():
+        db.create_all()
+        # Built once here and shared copy-on-write by the forked workers
+        app.extensions['suggest'].build()
+        # Built here rather than by the first similar-books request in every worker
+        if not app.extensions['content_index'].exists():
+            build_content_index()
+        # Workers open their own connections after the fork
+        db.engine.dispose()
+
+    print(f'Serving Bookify on http://{args.host}:{args.port}', flush=True)
+    if not hasattr(os, 'fork'):
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
+        return 0
+
+    sock = socket.create_server((args.host, args.port), backlog=2048)
+    sock.set_inheritable(True)
+    Master(app, sock, max(1, args.workers)).run()
+    sock.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
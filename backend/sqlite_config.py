@@ -0,0 +1,54 @@
+"""Production SQLite settings: WAL journaling, per-connection pragmas and
+fork-safe pooling, so several threads and worker processes can share one
+database file without "database is locked" errors.
+"""
+import os
+
+from sqlalchemy import event
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',        # readers no longer block on the writer
+    'synchronous': 'FULL',        # fsync the WAL on every commit, so a commit survives power loss
+    'cache_size': -64000,         # 64 MB page cache per connection
+    'mmap_size': 268435456,       # map up to 256 MB of the file
+    'busy_timeout': 5000,         # wait up to 5 s for the write lock
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_ENGINE_OPTIONS = {
+    'pool_size': 8,
+    'max_overflow': 8,
+    'pool_timeout': 30,
+}
+
+
+def configure_sqlite(engine, pragmas, immediate_writes=None):
+    """Apply ``pragmas`` on every new connection of ``engine``.
+
+    Transactions are begun explicitly so that, when ``immediate_writes()``
+    returns true, they start with BEGIN IMMEDIATE. Taking the write lock up
+    front makes writers queue on busy_timeout instead of failing when a
+    read transaction later tries to upgrade to a write.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy rather than the sqlite3 module issue BEGIN
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        if immediate_writes is not None and immediate_writes():
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.exec_driver_sql('BEGIN')
+
+    # A forked worker must not reuse connections opened by its parent
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
@@ -0,0 +1,137 @@
+"""Concurrency stress test for the SQLite database modes.
+
+Starts several worker processes, each running several threads that post
+reviews and shelf updates while reading books, all against one scratch
+database file. Afterwards it checks that every acknowledged review was
+stored and that the books' review aggregates still match the review table.
+It exits non-zero on any failed request or mismatch.
+
+    python stress_db.py                         # production mode (WAL, pragmas)
+    python stress_db.py --mode development      # compare with SQLite defaults
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BOOKS = 200
+
+
+def worker(threads, operations, seed):
+    """Run one worker process's threads and print its status counts as JSON"""
+    from app import create_app
+
+    app = create_app()
+    logging.getLogger('app').setLevel(logging.CRITICAL)
+    app.logger.setLevel(logging.CRITICAL)
+    counts = collections.Counter()
+    lock = threading.Lock()
+
+    def run(thread_index):
+        rng = random.Random(seed * 1000 + thread_index)
+        client = app.test_client()
+        local = collections.Counter()
+        for _ in range(operations):
+            book_id = rng.randint(1, BOOKS)
+            roll = rng.random()
+            if roll < 0.5:
+                response = client.post('/api/reviews', json={
+                    'book_id': book_id, 'reviewer_name': f'stress{seed}', 'rating': rng.randint(1, 5),
+                })
+                local[f'review {response.status_code}'] += 1
+            elif roll < 0.6:
+                response = client.post('/api/journal', json={'book_id': book_id, 'status': 'reading'})
+                local[f'journal {response.status_code}'] += 1
+            else:
+                response = client.get(f'/api/books/{book_id}')
+                local[f'read {response.status_code}'] += 1
+        with lock:
+            counts.update(local)
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    json.dump(counts, sys.stdout)
+
+
+def check_consistency(acknowledged_reviews):
+    """Compare stored reviews and aggregates with what the workers were told"""
+    from app import create_app, db
+
+    with create_app().app_context():
+        stored = db.session.execute(db.text('SELECT COUNT(*) FROM review')).scalar()
+        mismatched = db.session.execute(db.text(
+            'SELECT COUNT(*) FROM book WHERE review_count != '
+            '(SELECT COUNT(*) FROM review WHERE review.book_id = book.id) OR rating_sum != '
+            '(SELECT COALESCE(SUM(rating), 0) FROM review WHERE review.book_id = book.id)'
+        )).scalar()
+    problems = []
+    if stored != acknowledged_reviews:
+        problems.append(f'{acknowledged_reviews} reviews acknowledged but {stored} stored')
+    if mismatched:
+        problems.append(f'{mismatched} books have review aggregates out of sync')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress concurrent writes against one SQLite file')
+    parser.add_argument('--mode', choices=['production', 'development'], default='production')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--operations', type=int, default=100, help='requests per thread')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.threads, args.operations, args.worker)
+        return 0
+
+    directory = tempfile.mkdtemp(prefix='bookify-stress-')
+    env = dict(os.environ, BOOKIFY_DATABASE_URI='sqlite:///' + os.path.join(directory, 'stress.db'),
+               BOOKIFY_DB_MODE=args.mode)
+    subprocess.run([sys.executable, '-c', 'from seed_synthetic import seed_synthetic; '
+                    f'seed_synthetic({BOOKS}, 0, 0, log=lambda message: None)'],
+                   env=env, cwd=HERE, check=True)
+
+    started = time.perf_counter()
+    command = [sys.executable, os.path.abspath(__file__), '--threads', str(args.threads),
+               '--operations', str(args.operations), '--worker']
+    workers = [subprocess.Popen(command + [str(i)], env=env, cwd=HERE, stdout=subprocess.PIPE, text=True)
+               for i in range(args.processes)]
+    counts = collections.Counter()
+    for process in workers:
+        output, _ = process.communicate()
+        if process.returncode:
+            print(f'worker exited with {process.returncode}')
+            return 1
+        counts.update(json.loads(output))
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    print(f'{args.mode} mode: {args.processes} processes x {args.threads} threads, '
+          f'{total} requests in {elapsed:.1f}s ({total / elapsed:.0f} req/s)')
+    for key in sorted(counts):
+        print(f'  {key}: {counts[key]}')
+
+    os.environ.update(env)
+    problems = check_consistency(counts['review 201'])
+    problems += [f'{counts[key]} requests failed with {key}' for key in counts if key.endswith(' 500')]
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if not problems:
+        print('OK: no failed requests and review aggregates are consistent')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""In-memory typeahead index over book titles and authors.
+
+Each worker keeps the index in memory, so ``/api/suggest`` never touches
+the database.
+
+Entries are books, numbered in popularity order (review count, then
+rating). Entry 0 is the most reviewed book. The index maps every word of a
+title or author to its entries. Suggestions come back in popularity order,
+and a lookup can stop as soon as it has enough of them.
+
+Everything lives in a few flat buffers instead of per-book Python objects,
+so the index stays small with millions of titles:
+
+- the sorted vocabulary, as one UTF-8 byte string plus an offset array
+- one posting list of entry numbers per word, in one array
+- titles and authors, in one more byte string
+
+A query word matches every word it is a prefix of. The range of matching
+vocabulary words is found by binary search. For one- to three-letter
+prefixes, where that range is large, the top results are precomputed.
+When fewer than ``limit`` books match, words within edit distance 1 of the
+query's words are tried as well.
+
+Books created in this process are added at once. Books created by other
+workers are picked up every ``refresh_seconds``. The index is rebuilt in a
+background thread every ``rebuild_seconds`` if the catalog has changed, so
+popularity stays current.
+"""
+import heapq
+import itertools
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
+CACHED_PREFIX_LENGTH = 3
+MAX_LIMIT = 20
+# Shorter query words are only matched exactly
+MIN_FUZZY_LENGTH = 3
+# Candidates checked against the other words of a multi-word query
+MAX_SCAN = 2000
+# Query words whose fuzzy variants are remembered, per index snapshot
+FUZZY_CACHE_SIZE = 10000
+# Books added since the last rebuild that force an early rebuild
+MAX_RECENT = 5000
+
+_SEPARATOR = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Lowercase ``text``, strip accents and reduce it to space-separated words"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    if not text.isascii():
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _SEPARATOR.sub(' ', text).strip()
+
+
+class _Snapshot:
+    """Immutable index of the books passed to it, most popular first"""
+
+    def __init__(self, books):
+        books = sorted(books, key=lambda book: (-book[3], -book[4], book[0]))
+        self.book_ids = array('i', [book[0] for book in books])
+        self.max_id = max(self.book_ids, default=0)
+        self.text, self.text_offsets = _pack(f'{title}\x1f{author}'.encode('utf-8') for _, title, author, _, _ in books)
+
+        postings = {}
+        for entry, (_, title, author, _, _) in enumerate(books):
+            for word in set(normalize(f'{title} {author}').encode('utf-8').split()):
+                postings.setdefault(word, []).append(entry)
+        words = sorted(postings)
+        self.words, self.word_offsets = _pack(words)
+        self.postings = array('I')
+        self.posting_offsets = array('I', [0])
+        for word in words:
+            self.postings.extend(postings[word])
+            self.posting_offsets.append(len(self.postings))
+        self._postings = memoryview(self.postings)
+        self._word_count = len(words)
+        self._fuzzy_cache = {}
+
+        # Top entries for every short prefix
+        self.top = {}
+        for word in words:
+            for length in range(1, min(len(word), CACHED_PREFIX_LENGTH) + 1):
+                prefix = word[:length]
+                if prefix not in self.top:
+                    self.top[prefix] = array('I', self._stream(prefix, MAX_LIMIT))
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def _word(self, i):
+        return self.words[self.word_offsets[i]:self.word_offsets[i + 1]]
+
+    def word_range(self, prefix, lo=0, hi=None):
+        """(lo, hi) vocabulary positions of the words starting with ``prefix``, searching within lo:hi"""
+        hi = self._word_count if hi is None else hi
+        lo = self._bisect(prefix, lo, hi)
+        return lo, self._bisect(prefix + b'\xff', lo, hi)
+
+    def _bisect(self, target, lo, hi):
+        """First vocabulary position in lo:hi whose word is not below ``target``"""
+        # bisect's key= needs Python 3.10
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _stream(self, prefix, limit=None):
+        """Entries having a word that starts with ``prefix``, most popular first, without repeats"""
+        lo, hi = self.word_range(prefix)
+        lists = [self._postings[self.posting_offsets[i]:self.posting_offsets[i + 1]] for i in range(lo, hi)]
+        last = None
+        count = 0
+        for entry in heapq.merge(*lists):
+            if entry != last:
+                yield entry
+                last = entry
+                count += 1
+                if count == limit:
+                    return
+
+    def entry(self, entry):
+        """(book_id, title, author) of ``entry``"""
+        text = self.text[self.text_offsets[entry]:self.text_offsets[entry + 1]].decode('utf-8')
+        title, author = text.split('\x1f')
+        return self.book_ids[entry], title, author
+
+    def match(self, words, limit):
+        """Entries matching every word in ``words`` (bytes, each a prefix), most popular first"""
+        if len(words) == 1 and len(words[0]) <= CACHED_PREFIX_LENGTH:
+            return list(self.top.get(words[0], ()))[:limit]
+        if len(words) == 1:
+            return list(itertools.islice(self._stream(words[0]), limit))
+        ranges = [self.word_range(word) for word in words]
+        sizes = [self.posting_offsets[hi] - self.posting_offsets[lo] for lo, hi in ranges]
+        if not all(sizes):
+            return []
+        # Walk the entries of the most selective word, checking each for the others
+        driver = sizes.index(min(sizes))
+        others = words[:driver] + words[driver + 1:]
+        found = []
+        for entry in itertools.islice(self._stream(words[driver]), MAX_SCAN):
+            title, author = self.text[self.text_offsets[entry]:self.text_offsets[entry + 1]].decode('utf-8').split('\x1f')
+            if _has_words(normalize(f'{title} {author}').encode('utf-8'), others):
+                found.append(entry)
+                if len(found) == limit:
+                    break
+        return found
+
+    def fuzzy(self, word):
+        """Prefixes of vocabulary words one edit (deletion, insertion, substitution or transposition) from ``word``.
+
+        The vocabulary is walked like a trie. An edit can only be needed at or
+        before the first position where ``word`` stops being a prefix of any
+        vocabulary word, and only letters that actually follow the prefix so
+        far are tried.
+        """
+        if word in self._fuzzy_cache:
+            return self._fuzzy_cache[word]
+        variants = set()
+        lo, hi = 0, self._word_count
+        for i in range(len(word) + 1):
+            if lo == hi:
+                break
+            prefix, rest = word[:i], word[i + 1:]
+            candidates = []
+            if i < len(word) - 1:
+                candidates += [prefix + rest, prefix + word[i + 1:i + 2] + word[i:i + 1] + word[i + 2:]]
+            if i < len(word):
+                for char in self._children(prefix, lo, hi):
+                    candidates.append(prefix + char + word[i:])
+                    if char != word[i:i + 1]:
+                        candidates.append(prefix + char + rest)
+            for candidate in candidates:
+                if candidate != word and candidate not in variants:
+                    found_lo, found_hi = self.word_range(candidate, lo, hi)
+                    if found_lo < found_hi:
+                        variants.add(candidate)
+            lo, hi = self.word_range(word[:i + 1], lo, hi)
+        if len(self._fuzzy_cache) >= FUZZY_CACHE_SIZE:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[word] = variants
+        return variants
+
+    def _children(self, prefix, lo, hi):
+        """The distinct bytes following ``prefix`` in vocabulary words lo:hi, which all start with it"""
+        depth = len(prefix)
+        while lo < hi:
+            word = self._word(lo)
+            if len(word) == depth:
+                lo += 1
+                continue
+            char = word[depth:depth + 1]
+            yield char
+            lo = self._bisect(prefix + char + b'\xff', lo, hi)
+
+
+def _pack(items):
+    """Concatenate byte strings into one buffer with an offset array"""
+    offsets = array('I', [0])
+    chunks = []
+    for item in items:
+        chunks.append(item)
+        offsets.append(offsets[-1] + len(item))
+    return b''.join(chunks), offsets
+
+
+def _has_words(key, words):
+    """True if every word in ``words`` is a prefix of a word of the normalized ``key``"""
+    key_words = key.split()
+    return all(any(candidate.startswith(word) for candidate in key_words) for word in words)
+
+
+class SuggestIndex:
+    """Typeahead suggestions over every book's title and author.
+
+    ``load(after_id)`` returns ``(book_id, title, author, review_count,
+    rating)`` rows for the books with ids above ``after_id``. ``version()``
+    returns the catalog's data version. Both are called in an app context.
+    """
+
+    def __init__(self, app, load, version, refresh_seconds=30, rebuild_seconds=600):
+        self.app = app
+        self.load = load
+        self.version = version
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._snapshot = None
+        self._recent = []  # (book_id, title, author) added since the snapshot
+        self._built_version = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._next_refresh = self._next_rebuild = 0.0
+
+    def build(self):
+        """(Re)build the index from the database; needs an app context"""
+        version = self.version()
+        snapshot = _Snapshot(self.load(0))
+        with self._lock:
+            self._snapshot = snapshot
+            self._recent = [book for book in self._recent if book[0] > snapshot.max_id]
+            self._built_version = version
+            self._next_rebuild = time.monotonic() + self.rebuild_seconds
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+
+    def add(self, book_id, title, author):
+        """Make a newly created book suggestible right away"""
+        with self._lock:
+            self._recent.append((book_id, title, author))
+
+    def suggest(self, query, limit=10):
+        """[(book_id, title, author), ...] matching ``query``, most popular first"""
+        if self._snapshot is None:
+            self.build()
+        else:
+            self._maybe_refresh()
+        words = normalize(query).encode('utf-8').split()
+        if not words:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+        snapshot, recent = self._snapshot, self._recent
+
+        results = [snapshot.entry(entry) for entry in snapshot.match(words, limit)]
+        for book in recent:
+            if len(results) < limit and _has_words(normalize(f'{book[1]} {book[2]}').encode('utf-8'), words):
+                results.append(book)
+        if len(results) < limit:
+            # Typos: words within one edit of a query word, ranked with the rest by popularity
+            seen = {book[0] for book in results}
+            fuzzy = set()
+            for position, word in enumerate(words):
+                if len(word) >= MIN_FUZZY_LENGTH:
+                    for variant in snapshot.fuzzy(word):
+                        fuzzy.update(snapshot.match(words[:position] + [variant] + words[position + 1:], limit))
+            for entry in sorted(fuzzy):
+                book = snapshot.entry(entry)
+                if book[0] not in seen:
+                    results.append(book)
+                    if len(results) == limit:
+                        break
+        return results
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshing or now < self._next_refresh:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='suggest-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self.app.app_context():
+                due = time.monotonic() >= self._next_rebuild or len(self._recent) > MAX_RECENT
+                if due and self.version() != self._built_version:
+                    self.build()
+                    return
+                rows = self.load(self._snapshot.max_id)
+                with self._lock:
+                    known = {book[0] for book in self._recent}
+                    self._recent.extend((book_id, title, author) for book_id, title, author, _, _ in rows
+                                        if book_id not in known)
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._next_refresh = time.monotonic() + self.refresh_seconds
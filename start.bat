@@ -8,7 +8,7 @@ if not exist backend (
     exit /b 1
 )
 
-echo Starting Backend Server (Flask)...
+echo Starting Bookify Server...
 cd backend
 
 if not exist venv (
@@ -25,18 +25,11 @@ if not exist bookify.db (
     python seed_db.py
 )
 
-start python app.py
-echo Backend running on http://localhost:5000
+echo Open browser and go to http://localhost:5001
 echo.
-
-cd ..
-
-echo Starting Frontend Server...
-echo Open browser and go to http://localhost:8000
-echo.
-echo Press Ctrl+C to stop the servers
+echo Press Ctrl+C to stop the server
 echo.
 
-python -m http.server 8000
+python serve.py --port 5001
 
 pause
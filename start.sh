@@ -3,10 +3,9 @@
 echo "🚀 Starting Bookify Application..."
 echo ""
 
-# Kill any existing processes on ports 5001 and 8001
+# Kill any existing processes on port 5001
 echo "🧹 Cleaning up old processes..."
 lsof -i :5001 | grep -v COMMAND | awk '{print $2}' | xargs kill -9 2>/dev/null || true
-lsof -i :8001 | grep -v COMMAND | awk '{print $2}' | xargs kill -9 2>/dev/null || true
 sleep 1
 
 # Check if backend directory exists
@@ -15,8 +14,8 @@ if [ ! -d "backend" ]; then
     exit 1
 fi
 
-# Start backend
-echo "📦 Starting Backend Server (Flask)..."
+# Start server
+echo "📦 Starting Bookify Server..."
 cd backend
 
 # Create venv if it doesn't exist
@@ -37,26 +36,10 @@ if [ ! -f "instance/bookify.db" ] && [ ! -f "bookify.db" ]; then
     python seed_db.py
 fi
 
-# Start Flask server in background
-python app.py > /tmp/bookify_backend.log 2>&1 &
-BACKEND_PID=$!
-echo "✅ Backend running on http://localhost:5001/api"
+# Serve the API and the frontend from one origin with a worker per CPU
+echo "📍 Open browser and go to http://localhost:5001"
 echo ""
-
-# Return to root directory
-cd ..
-
-# Start frontend server
-echo "🎨 Starting Frontend Server..."
-echo "📍 Open browser and go to http://localhost:8001"
-echo ""
-echo "⚡ Bookify is ready! Press Ctrl+C to stop all servers"
+echo "⚡ Bookify is ready! Press Ctrl+C to stop the server"
 echo ""
 
-# Kill on interrupt
-trap "kill $BACKEND_PID 2>/dev/null; exit" INT
-
-python3 -m http.server 8001
-
-# Clean up
-kill $BACKEND_PID 2>/dev/null
+python serve.py --port 5001